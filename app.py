@@ -1,20 +1,27 @@
 import os
 from flask import Flask, request, redirect, session, url_for
-from flask_login import login_user, LoginManager, UserMixin, logout_user, current_user
+from flask_login import login_user, LoginManager, UserMixin, current_user
 
 import dash
-from dash import dcc, html, Input, Output, State, ALL
-from dash.exceptions import PreventUpdate
+from dash import dcc, html, Input, Output, ALL
 from utils.login_handler import restricted_page
 import dash_bootstrap_components as dbc
-from utils.database_connection import get_db_connection
-import bcrypt
-
-import sqlite3
+from utils.database_connection import check_login
+from utils.background import manager as background_manager
+from utils import metrics
+from utils.api import api
 
 # Exposing the Flask Server to enable configuring it for logging in
 server = Flask(__name__)
 
+# Callback responses are JSON and compress well; prefer brotli, fall back to gzip
+server.config.update(
+    COMPRESS_ALGORITHM=["br", "gzip"],
+    COMPRESS_MIN_SIZE=500,
+    # Leave streamed downloads (history export) alone so they are never buffered whole
+    COMPRESS_STREAMS=False,
+)
+
 key = os.getenv("DATABASE")
 
 @server.route('/login', methods=['POST'])
@@ -25,39 +32,26 @@ def login():
 
         if check_login(username, password) is None:
             return redirect(url_for("login") + "?error=1")
-        if check_login(username, password):
-            login_user(User(username))
-            if 'url' in session:
-                if session['url']:
-                    url = session['url']
-                    session['url'] = None
-                    return redirect(url) ## redirect to target url
-            return redirect('/') ## redirect to home
-        return redirect(url_for("login") + "?error=1")
-
-
-def check_login(username, password):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT username, password FROM users WHERE username = %s",
-        (username,)
-    )
-    user = cur.fetchone()
-    if not user:
-        return None
-    conn.commit()
-    conn.close()
-
-    if bcrypt.checkpw(password.encode("utf-8"), user[1].encode("utf-8")):
-        return user
-    else:
-        return None
+
+        login_user(User(username))
+        if 'url' in session:
+            if session['url']:
+                url = session['url']
+                session['url'] = None
+                return redirect(url) ## redirect to target url
+        return redirect('/') ## redirect to home
 
 app = dash.Dash(
-    __name__, server=server, use_pages=True, suppress_callback_exceptions=True, external_stylesheets=[dbc.themes.BOOTSTRAP]
+    __name__, server=server, use_pages=True, suppress_callback_exceptions=True, external_stylesheets=[dbc.themes.BOOTSTRAP],
+    compress=True,
+    background_callback_manager=background_manager,
 )
 
+# Callback timings, payload sizes and DB stats at /metrics, readiness at /healthz
+metrics.init_app(app)
+# Read-only JSON series for other clients, under /api/v1
+server.register_blueprint(api)
+
 # Updating the Flask Server configuration with Secret Key to encrypt the user session cookie
 server.config.update(SECRET_KEY = key)
 
@@ -0,0 +1,89 @@
+// Formulas for the calculator pages. They run in the browser as clientside
+// callbacks (see pages/bmi.py, basal-metabolic-rate.py, one-rep-max.py), so
+// toggling units or pressing Calculate never round-trips to the server.
+// utils/calculators.py has the same formulas in Python, and
+// tests/test_calculators.py checks both give the same answers.
+(function () {
+    // Python's format(value, ".Nf"): the exact binary value rounded, ties to even.
+    // toFixed rounds exact ties away from zero, so e.g. a BMR of 1062.5 would read 1063.
+    function fixed(value, digits) {
+        var exact = Math.abs(value).toFixed(100);
+        var end = exact.indexOf(".") + 1 + digits;
+        if (!/^50*$/.test(exact.slice(end))) {
+            return value.toFixed(digits);
+        }
+        var kept = exact.slice(0, digits ? end : end - 1);
+        if (Number(kept.charAt(kept.length - 1)) % 2) {
+            return value.toFixed(digits);
+        }
+        return (value < 0 ? "-" : "") + kept;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        calculators: {
+            // Show the metric or imperial input groups: [height metric, weight metric, height imperial, weight imperial]
+            toggleInputs: function (unit) {
+                var hidden = {display: "none"};
+                if (unit === "metric") {
+                    return [{}, {}, hidden, hidden];
+                }
+                return [hidden, hidden, {}, {}];
+            },
+
+            bmi: function (nClicks, unit, heightCm, weightKg, heightFt, heightIn, weightLb) {
+                var bmi;
+                if (unit === "metric") {
+                    if (!heightCm || !weightKg) {
+                        return "Please enter both height and weight.";
+                    }
+                    bmi = weightKg / Math.pow(heightCm / 100, 2);
+                } else {
+                    if (!heightFt || heightIn === null || heightIn === undefined || !weightLb) {
+                        return "Please enter weight, feet, and inches.";
+                    }
+                    var totalInches = heightFt * 12 + heightIn;
+                    bmi = 703 * weightLb / Math.pow(totalInches, 2);
+                }
+
+                var category;
+                if (bmi < 18.5) {
+                    category = "Underweight";
+                } else if (bmi < 25) {  // WHO bands, as in utils/calculators.py
+                    category = "Normal weight";
+                } else if (bmi < 30) {
+                    category = "Overweight";
+                } else {
+                    category = "Obesity";
+                }
+                return "Your BMI is " + fixed(bmi, 2) + " (" + category + ")";
+            },
+
+            // Mifflin-St Jeor BMR, scaled by the activity multiplier for TDEE
+            bmr: function (nClicks, units, gender, age, hCm, hFt, hIn, wKg, wLb, activity) {
+                if (!age || (units === "metric" && (!hCm || !wKg)) ||
+                        (units === "imperial" && ((!hFt && !hIn) || !wLb))) {
+                    return "⚠️ Please fill in all fields.";
+                }
+
+                var heightCm = units === "imperial" ? ((hFt || 0) * 12 + (hIn || 0)) * 2.54 : hCm;
+                var weight = units === "metric" ? wKg : wLb * 0.453592;
+
+                var bmr = 10 * weight + 6.25 * heightCm - 5 * age + (gender === "male" ? 5 : -161);
+                var tdee = bmr * parseFloat(activity);
+
+                return "Your BMR is " + fixed(bmr, 0) + " kcal/day • Estimated TDEE: " + fixed(tdee, 0) + " kcal/day";
+            },
+
+            // Epley formula
+            oneRepMax: function (nClicks, exercise, units, weight, reps) {
+                if (!weight || !reps) {
+                    return "⚠️ Please enter both weight and reps.";
+                }
+                var oneRm = weight * (1 + reps / 30);
+                var unitLabel = units === "metric" ? "kg" : "lbs";
+                var exerciseName = {bench: "Bench Press", squat: "Squat", deadlift: "Deadlift"}[exercise];
+                return exerciseName + " estimated 1RM: " + fixed(oneRm, 1) + " " + unitLabel;
+            }
+        }
+    });
+})();
@@ -0,0 +1,187 @@
+// Browser-side helpers for the history charts (see utils/downsample.py).
+(function () {
+    var DAY_MS = 86400000;
+    var LBS_PER_KG = 2.20462;
+    var DEFAULT_WIDTH = 800;
+    var MIN_POINTS = 50;
+    // Trend store keys of the overlay traces data[2], data[3], data[4]
+    // (TREND_OVERLAYS in pages/weight-input.py)
+    var TREND_KEYS = ["Trend", "Avg7", "Avg30"];
+
+    function round2(value) {
+        return value === null ? null : Math.round(value * 100) / 100;
+    }
+
+    // Indices of the points Largest-Triangle-Three-Buckets keeps (utils.downsample.lttb)
+    function lttb(x, y, threshold) {
+        var n = x.length, keep = [], i, j;
+        if (threshold >= n || threshold < 3) {
+            for (i = 0; i < n; i++) keep.push(i);
+            return keep;
+        }
+        var every = (n - 2) / (threshold - 2), a = 0;
+        keep.push(0);
+        for (i = 0; i < threshold - 2; i++) {
+            var start = Math.floor(i * every) + 1;
+            var end = Math.floor((i + 1) * every) + 1;
+            var nextEnd = Math.min(Math.floor((i + 2) * every) + 1, n);
+            var avgX = 0, avgY = 0;
+            for (j = end; j < nextEnd; j++) {
+                avgX += x[j];
+                avgY += y[j];
+            }
+            avgX /= nextEnd - end;
+            avgY /= nextEnd - end;
+            var best = start, bestArea = -1;
+            for (j = start; j < end; j++) {
+                var area = Math.abs((x[a] - avgX) * (y[j] - y[a]) - (x[a] - x[j]) * (avgY - y[a]));
+                if (area > bestArea) {
+                    best = j;
+                    bestArea = area;
+                }
+            }
+            a = best;
+            keep.push(a);
+        }
+        keep.push(n - 1);
+        return keep;
+    }
+
+    // Every entry, or one mean per day, in the display unit
+    function weightSeries(history, view, factor) {
+        var dates = history.Date || [], weights = history.Weight || [], x = [], y = [], i;
+        if (view !== "avg") {
+            for (i = 0; i < dates.length; i++) {
+                x.push(dates[i]);
+                y.push(round2(weights[i] * factor));
+            }
+            return {x: x, y: y};
+        }
+        // Entries are oldest first, so each day's weigh-ins are adjacent
+        var total = 0, count = 0;
+        for (i = 0; i < dates.length; i++) {
+            var day = Math.floor(dates[i] / DAY_MS) * DAY_MS;
+            if (!x.length || day !== x[x.length - 1]) {
+                if (count) y.push(round2(total / count * factor));
+                x.push(day);
+                total = count = 0;
+            }
+            total += weights[i];
+            count += 1;
+        }
+        if (count) y.push(round2(total / count * factor));
+        return {x: x, y: y};
+    }
+
+    // Stored dates are naive server times sent as if UTC, so print them as UTC
+    function dateText(ms, view) {
+        var text = new Date(ms).toISOString();
+        return view === "avg" ? text.slice(0, 10) : text.slice(0, 16).replace("T", " ");
+    }
+
+    // A date-axis bound from relayoutData ("2024-03-01 10:22:33.5"), as epoch ms
+    function axisMs(value) {
+        if (typeof value === "number") return value;
+        var text = String(value).replace(" ", "T");
+        return Date.parse(text.length === 10 ? text + "T00:00Z" : text + "Z");
+    }
+
+    // The visible x window after a zoom, widened to whole days as
+    // [first day, day after last); "reset" on autorange and null for anything
+    // else (y-only zoom, resize, ...), like relayout_window and day_window
+    function zoomWindow(relayout) {
+        if (!relayout) return null;
+        if (relayout["xaxis.autorange"]) return "reset";
+        var bounds = "xaxis.range[0]" in relayout
+            ? [relayout["xaxis.range[0]"], relayout["xaxis.range[1]"]]
+            : relayout["xaxis.range"];
+        if (!bounds) return null;
+        var start = axisMs(bounds[0]), end = axisMs(bounds[1]);
+        if (isNaN(start) || isNaN(end)) return null;
+        return [Math.floor(start / DAY_MS) * DAY_MS, (Math.floor(end / DAY_MS) + 1) * DAY_MS];
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        charts: {
+            // Pixel width of a graph, so the server sends about one point per pixel
+            graphWidth: function (graphId) {
+                var el = document.getElementById(graphId);
+                var width = el ? el.getBoundingClientRect().width : 0;
+                return Math.round(width || window.innerWidth);
+            },
+
+            // The weight chart drawn from the weight-history store, so unit, view,
+            // width and zoom changes never go to the server. Fills in the traces
+            // of the empty figure the page is served with (see build_weight_figure).
+            weightFigure: function (unit, view, width, uploaded, relayout, history, figure) {
+                if (!history || !figure || !figure.data) {
+                    return window.dash_clientside.no_update;
+                }
+                var zoom = zoomWindow(relayout);
+                var triggered = (window.dash_clientside.callback_context || {}).triggered || [];
+                var zoomed = triggered.some(function (t) { return t.prop_id === "weight-graph.relayoutData"; });
+                if (zoomed && zoom === null) {
+                    return window.dash_clientside.no_update;
+                }
+                var factor = unit === "lbs" ? LBS_PER_KG : 1;
+                var points = weightSeries(history, view, factor);
+
+                // History before today, downsampled; the tail from the last point
+                // before today. Zoomed in, the history is only the visible window,
+                // so it is shown at full resolution once it fits the width.
+                var now = new Date();
+                var today = Date.UTC(now.getFullYear(), now.getMonth(), now.getDate());
+                var split = 0;
+                while (split < points.x.length && points.x[split] < today) split++;
+                var first = 0, last = split;
+                if (zoom && zoom !== "reset") {
+                    while (first < split && points.x[first] < zoom[0]) first++;
+                    while (last > first && points.x[last - 1] >= zoom[1]) last--;
+                }
+                var shownX = points.x.slice(first, last), shownY = points.y.slice(first, last);
+                var budget = Math.max(Math.round(width || DEFAULT_WIDTH), MIN_POINTS);
+                var keep = lttb(shownX, shownY, budget);
+                var data = figure.data.map(function (trace) { return Object.assign({}, trace); });
+                data[0].x = keep.map(function (i) { return shownX[i]; });
+                data[0].y = keep.map(function (i) { return shownY[i]; });
+                var from = Math.max(split - 1, 0);
+                data[1].x = points.x.slice(from).map(function (ms) { return dateText(ms, view); });
+                data[1].y = points.y.slice(from);
+
+                // One point per day, downsampled alike; the last day is always
+                // kept, so add_weight can still patch it as data[i].y[-1]
+                var trend = history.trend || {Date: []};
+                var days = trend.Date.map(function (day) { return Date.parse(day); });
+                TREND_KEYS.forEach(function (key, i) {
+                    var values = (trend[key] || []).map(function (v) {
+                        return v === null ? null : round2(v * factor);
+                    });
+                    var kept = lttb(days, values, budget);
+                    data[2 + i].x = kept.map(function (j) { return trend.Date[j]; });
+                    data[2 + i].y = kept.map(function (j) { return values[j]; });
+                });
+
+                // "Trend 82.4 kg (-0.35 kg/week)", as _trend_title
+                var title = "";
+                if (trend.Date.length) {
+                    var last = trend.Date.length - 1;
+                    title = "Trend " + round2(trend.Trend[last] * factor).toFixed(1) + " " + unit;
+                    if (trend.Rate[last] !== null) {
+                        var rate = round2(trend.Rate[last] * factor);
+                        title += " (" + (rate < 0 ? "" : "+") + rate.toFixed(2) + " " + unit + "/week)";
+                    }
+                }
+                // The layout's uirevision keeps the user's zoom across redraws; the
+                // y axis has its own per unit, so its range resets when kg and lbs swap
+                var layout = Object.assign({}, figure.layout, {
+                    title: Object.assign({}, figure.layout.title, {text: title}),
+                    yaxis: Object.assign({}, figure.layout.yaxis, {
+                        title: Object.assign({}, (figure.layout.yaxis || {}).title, {text: "Weight (" + unit + ")"}),
+                        uirevision: unit
+                    })
+                });
+                return {data: data, layout: layout};
+            }
+        }
+    });
+})();
@@ -0,0 +1,213 @@
+"""Latency, memory and payload size of the data-heavy callbacks by history size.
+
+    python -m benchmarks.callbacks [--sizes 1000 10000 100000] [--repeat 5] [--keep]
+                                   [--save BASELINE.json] [--compare BASELINE.json [--tolerance 0.25]]
+
+Seeds one synthetic user per size (``bench_<n>``) with ``n`` meals, ``n``
+macro rows and ``n`` weigh-ins spread over three years. The callbacks are
+called directly, inside a request context with that user logged in. The
+history cache is cleared before every call, so each timing includes the
+database work. Writes (handle_meals, add_weight, add_macros) add one row per
+call. Seeded users are deleted at the end unless ``--keep`` is given, and are
+reused if they are already there.
+
+``--save`` writes the median, p95, peak memory and payload of every
+callback and size to a JSON baseline. ``--compare`` checks a run against one
+and exits with status 1 if any median latency, peak memory or payload grew by
+more than ``--tolerance`` (a fraction, 0.25 by default), so a regression can
+fail a CI job. Only compare baselines taken on the same machine and database.
+
+Needs a database with the migrations applied (``python -m utils.migrations``).
+"""
+import argparse
+import importlib
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+from flask_login import login_user
+from plotly.io.json import to_json_plotly
+from psycopg2.extras import execute_values
+
+from app import User, server
+from utils.cache import history_cache
+from utils.database_connection import get_db_connection
+from utils.nutrition_summary import rebuild
+from utils.weight_trend import load_trend
+
+calorietracker = importlib.import_module("pages.calorietracker")
+macros = importlib.import_module("pages.macros")
+weight_input = importlib.import_module("pages.weight-input")
+
+WIDTH = 1200
+DEFAULT_SORT = [{"column_id": "Date", "direction": "desc"}]
+HISTORY_DAYS = 3 * 365
+
+
+def _timestamps(n):
+    start = datetime.now() - timedelta(days=HISTORY_DAYS)
+    step = timedelta(days=HISTORY_DAYS) / n
+    return [start + step * i for i in range(n)]
+
+
+def seed_user(username, n):
+    """Create ``username`` with ``n`` rows in each history table, unless it already has them."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM calories_table WHERE username = %s", (username,))
+            if cur.fetchone()[0] >= n:
+                return False
+            cur.execute(
+                "INSERT INTO users (email, username, password) VALUES (%s, %s, 'x') ON CONFLICT DO NOTHING",
+                (f"{username}@example.invalid", username),
+            )
+            times = _timestamps(n)
+            execute_values(
+                cur, "INSERT INTO calories_table (username, meal_name, calories, date) VALUES %s",
+                [(username, f"Meal {i % 50}", random.randint(100, 900), t) for i, t in enumerate(times)],
+                page_size=5000,
+            )
+            execute_values(
+                cur, "INSERT INTO macros_table (username, meal_name, protein, carbs, fats, date) VALUES %s",
+                [(username, f"Meal {i % 50}", random.randint(5, 60), random.randint(5, 120), random.randint(2, 40), t)
+                 for i, t in enumerate(times)],
+                page_size=5000,
+            )
+            weight = 85.0
+            rows = []
+            for t in times:
+                weight = min(max(weight + random.uniform(-0.4, 0.4), 60), 110)
+                rows.append((username, round(weight, 2), t))
+            execute_values(
+                cur, "INSERT INTO bodyweight (username, weight_kg, created_at) VALUES %s", rows, page_size=5000,
+            )
+            cur.execute("ANALYZE calories_table; ANALYZE macros_table; ANALYZE bodyweight")
+    rebuild(username)
+    return True
+
+
+def drop_user(username):
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            for table in ("calories_table", "macros_table", "bodyweight", "daily_nutrition_summary"):
+                cur.execute(f"DELETE FROM {table} WHERE username = %s", (username,))
+            cur.execute("DELETE FROM users WHERE username = %s", (username,))
+
+
+def _triggered(prop_id):
+    # What Dash sets while dispatching a callback, so ctx.triggered_id works
+    context_value.set(AttributeDict(triggered_inputs=[{"prop_id": prop_id, "value": 1}]))
+
+
+def cases(username):
+    """(name, call) pairs; each call runs one callback for the logged-in ``username``."""
+    def handle_meals():
+        _triggered("add-meal-btn.n_clicks")
+        return calorietracker.handle_meals(
+            1, [], "Benchmark meal", 500, [], [], 0, 0, 20, DEFAULT_SORT, "")
+
+    return [
+        ("render_calorie_graph", lambda: calorietracker.render_calorie_graph(WIDTH)),
+        ("update_meals_table", lambda: calorietracker.update_meals_table(0, 20, DEFAULT_SORT, "", 0, {})),
+        ("handle_meals", handle_meals),
+        ("load_daily_macros", lambda: macros.load_daily_macros(username)),
+        ("update_macro_line", lambda: macros.update_macro_line(macros.load_daily_macros(username), WIDTH)),
+        ("add_macros", lambda: macros.add_macros(1, "Benchmark meal", 30, 40, 10, 0)),
+        ("get_user_weights", weight_input.get_user_weights),
+        ("load_trend", lambda: load_trend(username)),
+        ("update_weight_table", lambda: weight_input.update_weight_table(0, 20, DEFAULT_SORT, "", "kg", 0, {})),
+        ("add_weight", lambda: weight_input.add_weight(
+            1, 80, "kg", "kg", "avg", WIDTH, 0, 0, 20, DEFAULT_SORT, "")),
+    ]
+
+
+def measure(call, repeat):
+    timings, peaks = [], []
+    for _ in range(repeat):
+        history_cache.clear()
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = call()
+        timings.append((time.perf_counter() - start) * 1000)
+        peaks.append(tracemalloc.get_traced_memory()[1] / 1e6)
+        tracemalloc.stop()
+    return timings, max(peaks), len(to_json_plotly(result).encode())
+
+
+# Baseline fields checked by --compare
+COMPARED = ("median_ms", "peak_mb", "payload_bytes")
+
+
+def regressions(results, baseline, tolerance):
+    """``(size, callback, field, baseline value, new value)`` for each field that grew past ``tolerance``."""
+    found = []
+    for size, callbacks in results.items():
+        for name, stats in callbacks.items():
+            before = baseline.get(size, {}).get(name)
+            if before is None:
+                continue
+            for field in COMPARED:
+                if stats[field] > before[field] * (1 + tolerance):
+                    found.append((size, name, field, before[field], stats[field]))
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded users for the next run")
+    parser.add_argument("--save", metavar="PATH", help="write the results to a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="fail if the results regressed against a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed growth over the baseline, as a fraction")
+    args = parser.parse_args(argv)
+
+    random.seed(0)
+    server.secret_key = server.secret_key or "benchmark"
+    print(f"{'rows':>7} {'callback':<22} {'median':>10} {'p95':>10} {'peak mem':>10} {'payload':>10}")
+    results = {}  # str(size) -> callback -> stats, as stored in a baseline
+    try:
+        for n in args.sizes:
+            username = f"bench_{n}"
+            if seed_user(username, n):
+                print(f"seeded {username}")
+            with server.test_request_context():
+                login_user(User(username))
+                for name, call in cases(username):
+                    timings, peak_mb, size = measure(call, args.repeat)
+                    timings.sort()
+                    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                    print(f"{n:>7} {name:<22} {statistics.median(timings):7.1f} ms {p95:7.1f} ms "
+                          f"{peak_mb:7.1f} MB {size / 1024:7.0f} KB")
+                    results.setdefault(str(n), {})[name] = {
+                        "median_ms": round(statistics.median(timings), 2), "p95_ms": round(p95, 2),
+                        "peak_mb": round(peak_mb, 2), "payload_bytes": size,
+                    }
+    finally:
+        if not args.keep:
+            for n in args.sizes:
+                drop_user(f"bench_{n}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"saved baseline to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline, args.tolerance)
+        for n, name, field, before, after in found:
+            print(f"REGRESSION {n:>7} {name:<22} {field}: {before} -> {after}")
+        if found:
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
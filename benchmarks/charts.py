@@ -0,0 +1,79 @@
+"""Compare payload size and serialisation time of the history chart encodings.
+
+    python -m benchmarks.charts [--sizes 10000 50000 100000] [--repeat 3]
+
+"legacy" is the old figure: an SVG ``go.Scatter`` with string dates in Python
+lists on a category axis. "typed" is ``utils.charts.build_history_figure``:
+``Scattergl`` with epoch-ms/float typed arrays on a date axis. Downsampling is
+bypassed so both encode every point. No database is needed.
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from utils.charts import LINE_COLOR, build_history_figure
+
+SERIES = [("Weight", "Weight", LINE_COLOR)]
+
+
+def make_rows(n):
+    # A scale logging every couple of hours, drifting around 80 kg
+    start = datetime(2015, 1, 1)
+    weight = 80.0
+    rows = []
+    for i in range(n):
+        weight += random.uniform(-0.3, 0.3)
+        rows.append({"Date": (start + timedelta(hours=2 * i)).strftime("%Y-%m-%d %H:%M"), "Weight": round(weight, 2)})
+    return rows
+
+
+def legacy_figure(rows):
+    fig = go.Figure(go.Scatter(
+        x=[str(row["Date"]) for row in rows],
+        y=[row["Weight"] for row in rows],
+        mode="lines+markers",
+        line=dict(shape="spline", smoothing=1.3, width=3, color=LINE_COLOR),
+        marker=dict(size=6, color=LINE_COLOR),
+    ))
+    fig.update_layout(xaxis_type="category", template="simple_white")
+    return fig
+
+
+def typed_figure(rows):
+    return build_history_figure(rows, SERIES, "Weight (kg)")
+
+
+def measure(build, rows, repeat):
+    build_ms, json_ms = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fig = build(rows)
+        built = time.perf_counter()
+        payload = pio.to_json(fig, validate=False)
+        build_ms.append((built - start) * 1000)
+        json_ms.append((time.perf_counter() - built) * 1000)
+    return len(payload.encode()), statistics.median(build_ms), statistics.median(json_ms)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    random.seed(0)
+    print(f"{'points':>8} {'encoding':<8} {'payload':>10} {'build':>10} {'to_json':>10}")
+    for n in args.sizes:
+        rows = make_rows(n)
+        for name, build in (("legacy", legacy_figure), ("typed", typed_figure)):
+            size, build_ms, json_ms = measure(build, rows, args.repeat)
+            print(f"{n:>8} {name:<8} {size / 1024:>7.0f} KB {build_ms:>7.1f} ms {json_ms:>7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
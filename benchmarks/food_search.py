@@ -0,0 +1,49 @@
+"""Compare local (Postgres) and remote (USDA API) food search latency.
+
+    python -m benchmarks.food_search [--repeat 5] [query ...]
+
+Needs the local food tables loaded (``python -m utils.fdc_import``) and
+USDA_API_KEY set. The remote timing bypasses the on-disk search cache.
+"""
+import argparse
+import statistics
+import time
+
+from utils.food_search import search_local_foods
+from utils.usda_query import fetch_usda_foods
+
+DEFAULT_QUERIES = ["chicken breast", "banana", "brown rice", "greek yogurt", "cheddar cheese", "oatmeal"]
+
+
+def time_calls(func, queries, repeat):
+    timings = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            func(query)
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{name:<8} n={len(timings):<4} median={statistics.median(timings):8.1f} ms  p95={p95:8.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("queries", nargs="*", default=DEFAULT_QUERIES)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    # Warm up the connection pool and HTTP session so setup cost is not measured
+    search_local_foods(args.queries[0])
+    fetch_usda_foods(args.queries[0])
+
+    report("local", time_calls(search_local_foods, args.queries, args.repeat))
+    report("remote", time_calls(fetch_usda_foods, args.queries, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Login latency: the old double-check path against the single-pass check_login.
+
+    python -m benchmarks.login [--repeat 20]
+
+Creates a throwaway user in the configured database and deletes it afterwards.
+"before" reproduces the old /login route: a fresh connection and a bcrypt
+verification for each of its two check_login calls.
+"""
+import argparse
+import secrets
+import statistics
+import time
+
+import bcrypt
+import psycopg2
+
+from utils.database_connection import check_login, connection_params, get_db_connection, save_user_to_db
+
+
+def legacy_check_login(username, password):
+    conn = psycopg2.connect(**connection_params())
+    cur = conn.cursor()
+    cur.execute("SELECT username, password FROM users WHERE username = %s", (username,))
+    user = cur.fetchone()
+    conn.close()
+    if user and bcrypt.checkpw(password.encode("utf-8"), user[1].encode("utf-8")):
+        return user
+    return None
+
+
+def legacy_login(username, password):
+    if legacy_check_login(username, password) is None:
+        return False
+    return bool(legacy_check_login(username, password))
+
+
+def time_calls(func, username, password, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        assert func(username, password)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    username = f"bench_{secrets.token_hex(4)}"
+    password = secrets.token_urlsafe(12)
+    save_user_to_db(f"{username}@example.invalid", username, password)
+    try:
+        check_login(username, password)  # warm the pool
+        for name, func in (("before", legacy_login), ("after", check_login)):
+            timings = time_calls(func, username, password, args.repeat)
+            print(f"{name:<7} median={statistics.median(timings):7.1f} ms  max={max(timings):7.1f} ms")
+    finally:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM users WHERE username = %s", (username,))
+
+
+if __name__ == "__main__":
+    main()
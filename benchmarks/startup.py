@@ -0,0 +1,91 @@
+"""Measure cold start: import cost by package and time to the first response.
+
+    python -m benchmarks.startup [--repeat 5] [--top 15] [--budget-ms 1500]
+
+Each run is a fresh interpreter, like a new or restarted worker. The import
+breakdown comes from ``python -X importtime -c "import app"``. Time to first
+response is measured from process start until the Flask test client has served
+the index page and the Dash layout. No database is needed because connections
+are only opened on first use. With ``--budget-ms`` the exit code is 1 when the
+median time to first response exceeds the budget.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_RESPONSE = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.server.test_client()
+client.get("/")
+client.get("/_dash-layout")
+served = time.perf_counter()
+print(json.dumps({"import": imported - start, "first_response": served - start}))
+"""
+
+
+def import_breakdown():
+    """Self time in ms per top-level package for one ``import app``."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    totals = defaultdict(float)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        totals[name.strip().split(".")[0]] += int(self_us) / 1000
+    return totals
+
+
+def first_response():
+    """Seconds from interpreter start to imports done and to the first response served."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_RESPONSE],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    wall = time.perf_counter() - start
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process"] = wall
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    totals = import_breakdown()
+    print(f"Import self time by package (total {sum(totals.values()):.0f} ms):")
+    for name, ms in sorted(totals.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {name:<28} {ms:8.1f} ms")
+
+    runs = [first_response() for _ in range(args.repeat)]
+    print(f"\nCold start over {args.repeat} runs (median):")
+    for key, label in (("import", "import app"), ("first_response", "first response"), ("process", "process wall time")):
+        print(f"  {label:<28} {statistics.median(run[key] for run in runs) * 1000:8.1f} ms")
+
+    if args.budget_ms is not None:
+        median_ms = statistics.median(run["first_response"] for run in runs) * 1000
+        if median_ms > args.budget_ms:
+            print(f"\n❌ First response took {median_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+            return 1
+        print(f"\n✅ First response within the {args.budget_ms:.0f} ms budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
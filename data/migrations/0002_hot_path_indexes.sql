@@ -0,0 +1,17 @@
+-- Composite indexes matching the WHERE + ORDER BY of the per-user history
+-- queries, so they are served by an index range scan instead of a sort over
+-- the whole table. History tables are paged by (sort value, id); carrying id
+-- in the index lets the default newest-first page be read straight off it.
+-- users.email needs nothing here: its UNIQUE constraint already indexes it.
+
+CREATE INDEX IF NOT EXISTS calories_table_username_date_id_idx
+    ON calories_table (username, date, id);
+
+CREATE INDEX IF NOT EXISTS macros_table_username_date_id_idx
+    ON macros_table (username, date, id);
+
+CREATE INDEX IF NOT EXISTS bodyweight_username_created_at_id_idx
+    ON bodyweight (username, created_at, id);
+
+CREATE INDEX IF NOT EXISTS password_resets_token_expires_at_idx
+    ON password_resets (token, expires_at);
@@ -0,0 +1,30 @@
+-- Local copy of the FoodData Central release (loaded by `python -m utils.fdc_import`)
+-- so food search does not depend on the USDA API.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE TABLE IF NOT EXISTS fdc_food (
+    fdc_id INTEGER PRIMARY KEY,
+    data_type TEXT NOT NULL,
+    description TEXT NOT NULL,
+    description_tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('english', description)) STORED
+);
+
+CREATE TABLE IF NOT EXISTS fdc_nutrient (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    unit_name TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS fdc_food_nutrient (
+    fdc_id INTEGER NOT NULL REFERENCES fdc_food (fdc_id) ON DELETE CASCADE,
+    nutrient_id INTEGER NOT NULL REFERENCES fdc_nutrient (id),
+    amount NUMERIC NOT NULL,
+    PRIMARY KEY (fdc_id, nutrient_id)
+);
+
+CREATE INDEX IF NOT EXISTS fdc_food_description_tsv_idx
+    ON fdc_food USING gin (description_tsv);
+
+CREATE INDEX IF NOT EXISTS fdc_food_description_trgm_idx
+    ON fdc_food USING gin (description gin_trgm_ops);
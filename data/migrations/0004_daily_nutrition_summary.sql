@@ -0,0 +1,30 @@
+-- One row per user and day with the day's calorie and macro totals, kept up to
+-- date by save_meal in the same transaction as the meal insert. The history
+-- charts read this instead of re-summing every logged meal.
+-- calorie_entries/macro_entries tell days logged on one page from the other.
+
+CREATE TABLE IF NOT EXISTS daily_nutrition_summary (
+    username TEXT NOT NULL REFERENCES users (username) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    kcal NUMERIC NOT NULL DEFAULT 0,
+    protein NUMERIC NOT NULL DEFAULT 0,
+    carbs NUMERIC NOT NULL DEFAULT 0,
+    fat NUMERIC NOT NULL DEFAULT 0,
+    calorie_entries INTEGER NOT NULL DEFAULT 0,
+    macro_entries INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (username, day)
+);
+
+-- Backfill from the existing history; python -m utils.nutrition_summary redoes this on demand
+INSERT INTO daily_nutrition_summary (username, day, kcal, protein, carbs, fat, calorie_entries, macro_entries)
+SELECT username, day, SUM(kcal), SUM(protein), SUM(carbs), SUM(fat), SUM(calorie_entries), SUM(macro_entries)
+FROM (
+    SELECT username, date::date AS day, calories AS kcal, 0 AS protein, 0 AS carbs, 0 AS fat,
+           1 AS calorie_entries, 0 AS macro_entries
+    FROM calories_table
+    UNION ALL
+    SELECT username, date::date, 0, protein, carbs, fats, 0, 1
+    FROM macros_table
+) entries
+GROUP BY username, day
+ON CONFLICT (username, day) DO NOTHING;
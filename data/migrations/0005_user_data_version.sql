@@ -0,0 +1,5 @@
+-- Per-user counter bumped in the same transaction as every write to the user's
+-- meals, macros or weigh-ins. The JSON API uses it as the ETag of a user's
+-- series, so an unchanged series is answered with a 304 from this one row.
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS data_version BIGINT NOT NULL DEFAULT 0;
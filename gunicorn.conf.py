@@ -0,0 +1,37 @@
+"""Gunicorn settings, read automatically from the working directory:
+
+    gunicorn wsgi:server
+
+Every value can be overridden from the environment. The app is imported once
+in the master and then forked (``preload_app``), so workers start without
+re-importing it. The connection pool, SMTP worker, USDA session and search
+thread pool are created per process on first use, so no sockets or threads
+are shared across the fork.
+
+Each worker opens up to DB_POOL_MAX database connections. Keep
+WEB_CONCURRENCY * DB_POOL_MAX under the database's connection limit, and keep
+DB_POOL_MAX at or above GUNICORN_THREADS plus BACKGROUND_MAX_RUNNING (the
+search pool's threads).
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_class = "gthread"
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Recycle workers now and then so a slow leak can't grow forever
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+
+preload_app = True
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
@@ -1,5 +1,5 @@
 import dash
-from dash import html, dcc, Input, Output, State
+from dash import html, dcc, Input, Output, State, ClientsideFunction
 import dash_bootstrap_components as dbc
 
 dash.register_page(__name__)
@@ -104,21 +104,19 @@ layout = dbc.Container(
 )
 
 # ---------------- Show/hide inputs depending on unit ----------------
-@dash.callback(
+# Both callbacks run in the browser, see assets/calculators.js
+dash.clientside_callback(
+    ClientsideFunction(namespace="calculators", function_name="toggleInputs"),
     Output("bmr-height-metric-group", "style"),
     Output("bmr-weight-metric-group", "style"),
     Output("bmr-height-imperial-group", "style"),
     Output("bmr-weight-imperial-group", "style"),
     Input("bmr-units", "value")
 )
-def toggle_inputs(unit):
-    if unit == "metric":
-        return {}, {}, {"display": "none"}, {"display": "none"}
-    else:
-        return {"display": "none"}, {"display": "none"}, {}, {}
 
 # ---------------- BMR calculation ----------------
-@dash.callback(
+dash.clientside_callback(
+    ClientsideFunction(namespace="calculators", function_name="bmr"),
     Output("bmr-result", "children"),
     Input("bmr-calc-btn", "n_clicks"),
     State("bmr-units", "value"),
@@ -132,23 +130,3 @@ def toggle_inputs(unit):
     State("bmr-activity", "value"),
     prevent_initial_call=True
 )
-def calculate_bmr(n, units, gender, age, h_cm, h_ft, h_in, w_kg, w_lb, activity):
-    if not age or (units=="metric" and (not h_cm or not w_kg)) or (units=="imperial" and (not h_ft and not h_in or not w_lb)):
-        return "⚠️ Please fill in all fields."
-
-    # Convert height to cm if imperial
-    if units == "imperial":
-        h_cm = (h_ft*12 + h_in) * 2.54
-
-    # Convert weight to kg if imperial
-    weight = w_kg if units=="metric" else w_lb * 0.453592
-
-    # BMR calculation
-    if gender == "male":
-        bmr = 10 * weight + 6.25 * h_cm - 5 * age + 5
-    else:
-        bmr = 10 * weight + 6.25 * h_cm - 5 * age - 161
-
-    tdee = bmr * float(activity)
-
-    return f"Your BMR is {bmr:.0f} kcal/day • Estimated TDEE: {tdee:.0f} kcal/day"
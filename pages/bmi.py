@@ -1,5 +1,5 @@
 import dash
-from dash import html, dcc, Input, Output, State
+from dash import html, dcc, Input, Output, State, ClientsideFunction
 import dash_bootstrap_components as dbc
 
 dash.register_page(__name__)
@@ -73,22 +73,19 @@ layout = dbc.Container(
     ]
 )
 
-# Show/hide inputs depending on unit
-@dash.callback(
+# Show/hide inputs depending on unit (runs in the browser, see assets/calculators.js)
+dash.clientside_callback(
+    ClientsideFunction(namespace="calculators", function_name="toggleInputs"),
     Output("bmi-height-metric-group", "style"),
     Output("bmi-weight-metric-group", "style"),
     Output("bmi-height-imperial-group", "style"),
     Output("bmi-weight-imperial-group", "style"),
     Input("bmi-units", "value")
 )
-def toggle_inputs(unit):
-    if unit == "metric":
-        return {}, {}, {"display": "none"}, {"display": "none"}
-    else:
-        return {"display": "none"}, {"display": "none"}, {}, {}
 
 # Calculate BMI
-@dash.callback(
+dash.clientside_callback(
+    ClientsideFunction(namespace="calculators", function_name="bmi"),
     Output("bmi-result", "children"),
     Input("bmi-calc-btn", "n_clicks"),
     State("bmi-units", "value"),
@@ -99,24 +96,3 @@ def toggle_inputs(unit):
     State("bmi-weight-imperial", "value"),
     prevent_initial_call=True
 )
-def calculate_bmi(n_clicks, unit, height_cm, weight_kg, height_ft, height_in, weight_lb):
-    if unit == "metric":
-        if not height_cm or not weight_kg:
-            return "Please enter both height and weight."
-        bmi = weight_kg / ((height_cm / 100) ** 2)
-    else:
-        if not height_ft or height_in is None or not weight_lb:
-            return "Please enter weight, feet, and inches."
-        total_inches = height_ft * 12 + height_in
-        bmi = 703 * weight_lb / (total_inches ** 2)
-
-    if bmi < 18.5:
-        category = "Underweight"
-    elif 18.5 <= bmi < 24.9:
-        category = "Normal weight"
-    elif 25 <= bmi < 29.9:
-        category = "Overweight"
-    else:
-        category = "Obesity"
-
-    return f"Your BMI is {bmi:.2f} ({category})"
@@ -1,46 +1,67 @@
 import dash
-from dash import Dash, dcc, html, Input, Output, State, dash_table
+from dash import Dash, dcc, html, Input, Output, State, dash_table, Patch, ctx, ClientsideFunction
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-import pandas as pd
-import plotly.graph_objects as go
+import time
 from datetime import datetime
-import psycopg2
-import base64, io
+import requests
 from utils.database_connection import get_db_connection
 from utils.login_handler import require_login
 from flask_login import current_user
-import requests
-from utils.usda_query import query_usda_info
+from utils.food_search import search_foods
+from utils.background import SEARCH_TIMEOUT, QueueFull, cancel_pooled, pooled_result, start_pooled
+from utils.aggregates import get_calorie_totals, get_calorie_tail
+from utils.pagination import DATE_FORMAT, table_spec, fetch_page, new_row_outputs
+from utils.cache import history_cache
+from utils.nutrition_summary import record_meal
+from utils import data_version
+from utils.export import export_links
+from utils.downsample import downsample, zoom_patch
+from utils.charts import LINE_COLOR, build_history_figure
 
 
 dash.register_page(__name__)
 require_login(__name__)
 
 def save_meal(username, meal_name, calories):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO calories_table (username, meal_name, calories, date) VALUES (%s, %s, %s, %s)",
-        (username, meal_name, calories, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
+    """Insert a meal and return the timestamp it was logged at."""
+    logged_at = datetime.now().replace(microsecond=0)
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO calories_table (username, meal_name, calories, date) VALUES (%s, %s, %s, %s)",
+                (username, meal_name, calories, logged_at)
+            )
+            record_meal(cur, username, logged_at, kcal=calories)
+            version = data_version.bump(cur, username)
+    history_cache.written(username, version, "calories_table")
+    return logged_at
 
-def get_user_meals():
-    if not (hasattr(current_user, "is_authenticated") and current_user.is_authenticated):
-        return []
-    conn = get_db_connection()
-    cur = conn.cursor()
+MEALS_TABLE = table_spec("calories_table", {
+    "Date": ("date", "timestamp"),
+    "Meal": ("meal_name", "text"),
+    "Calories": ("calories", "number"),
+})
+
+CALORIE_SERIES = [("Calories", "Calories", LINE_COLOR)]
 
-    cur.execute(
-        "SELECT date, meal_name, calories FROM calories_table WHERE username = %s ORDER BY date ASC",
-        (current_user.id,)
+
+def build_calorie_figure(daily_totals, width=None):
+    """Daily calorie chart as a history trace plus a tail trace for today.
+
+    The tail starts at the last day before today so the line stays joined. Adding
+    a meal only replaces the tail (see handle_meals), which keeps the update the
+    same size however long the history is. The history is downsampled to the
+    chart's ``width`` in pixels.
+    """
+    today = datetime.now().date()
+    history = [row for row in daily_totals if row["Date"] < today]
+    tail = history[-1:] + [row for row in daily_totals if row["Date"] >= today]
+
+    return build_history_figure(
+        downsample(history, width, ["Calories"]), CALORIE_SERIES, "Calories", tail=tail,
+        uirevision="calories",
     )
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return [{"Date": row[0].strftime('%Y-%m-%d %H:%M:%S'), "Meal": row[1], "Calories": row[2]} for row in rows]
 
 
 def serve_layout():
@@ -57,6 +78,11 @@ def serve_layout():
                 children=[
                     # Manual Entry
                     dcc.Store(id="food-search-store", data=[]),
+                    dcc.Store(id="food-search-job"),
+                    dcc.Interval(id="food-search-poll", interval=500, disabled=True),
+                    dcc.Store(id="meals-version", data=0),
+                    dcc.Store(id="meals-table-cursors", data={}),
+                    dcc.Store(id="calorie-graph-width"),
                     dbc.Card(
                         className="shadow-sm p-3 mb-4",
                         children=[
@@ -79,10 +105,12 @@ def serve_layout():
                                 [
                                     dbc.Input(id="food-query", placeholder="Search for a food (e.g., chicken breast)", type="text"),
                                     dbc.Button("Search", id="search-btn", color="primary"),
+                                    dbc.Button("Cancel", id="cancel-search-btn", color="secondary", style={"display": "none"}),
                                 ],
                                 className="mb-3"
                             ),
-                            
+                            html.Div(id="food-search-status", className="text-muted mb-2"),
+
                             html.Div(id="food-results")
                         ],
                         className="p-4"
@@ -104,36 +132,88 @@ def serve_layout():
                                     {"name": "Meal", "id": "Meal"},
                                     {"name": "Calories", "id": "Calories"},
                                 ],
+                                page_current=0,
+                                page_size=20,
+                                page_action="custom",
+                                sort_action="custom",
+                                sort_mode="single",
+                                sort_by=[{"column_id": "Date", "direction": "desc"}],
+                                filter_action="custom",
+                                filter_query="",
                                 style_table={"overflowX": "auto"},
                                 style_cell={"textAlign": "center", "padding": "8px", "minWidth": "80px", "whiteSpace": "normal"},
                             ),
+                            export_links("meals"),
                         ]
                     ),
                 ]
             )
 
+dash.clientside_callback(
+    ClientsideFunction(namespace="charts", function_name="graphWidth"),
+    Output("calorie-graph-width", "data"),
+    Input("daily-calories-graph", "id"),
+)
+
+
 @dash.callback(
-    Output("meal-output", "children"),
-    Output("meals-table", "data"),
     Output("daily-calories-graph", "figure"),
+    Input("calorie-graph-width", "data"),
+)
+def render_calorie_graph(width):
+    if not (hasattr(current_user, "is_authenticated") and current_user.is_authenticated):
+        raise PreventUpdate
+    return build_calorie_figure(get_calorie_totals(current_user.id), width)
+
+
+@dash.callback(
+    Output("daily-calories-graph", "figure", allow_duplicate=True),
+    Input("daily-calories-graph", "relayoutData"),
+    State("calorie-graph-width", "data"),
+    prevent_initial_call=True
+)
+def zoom_calorie_graph(relayout, width):
+    fig = zoom_patch(
+        relayout, lambda start, end: get_calorie_totals(current_user.id, start=start, end=end), width,
+        ["Calories"], before=datetime.now().date(),
+    )
+    if fig is None:
+        raise PreventUpdate
+    return fig
+
+
+@dash.callback(
+    Output("meal-output", "children"),
+    Output("meals-table", "data", allow_duplicate=True),
+    Output("meals-version", "data"),
+    Output("daily-calories-graph", "figure", allow_duplicate=True),
+    Output("meals-table-cursors", "data", allow_duplicate=True),
     Input("add-meal-btn", "n_clicks"),
     Input({"type": "log-btn", "index": dash.ALL}, "n_clicks"),
     State("meal-name-input", "value"),
     State("calories-input", "value"),
     State({"type": "weight-input", "index": dash.ALL}, "value"),
     State("food-search-store", "data"),
+    State("meals-version", "data"),
+    State("meals-table", "page_current"),
+    State("meals-table", "page_size"),
+    State("meals-table", "sort_by"),
+    State("meals-table", "filter_query"),
+    prevent_initial_call=True
 )
-def handle_meals(manual_clicks, search_clicks, meal_name, calories, weights, search_data):
-    msg = ""
+def handle_meals(manual_clicks, search_clicks, meal_name, calories, weights, search_data, version,
+                 page_current, page_size, sort_by, filter_query):
+    triggered = ctx.triggered_id
 
     # Manual entry
-    if manual_clicks and meal_name and calories is not None:
-        save_meal(current_user.id, meal_name, calories)
+    if triggered == "add-meal-btn" and meal_name and calories is not None:
+        logged_at = save_meal(current_user.id, meal_name, calories)
+        row = {"Meal": meal_name, "Calories": float(calories)}
         msg = f"✅ Meal added: {meal_name} ({calories} kcal)"
 
     # Search + weight logging
-    if search_clicks and any(search_clicks):
-        idx = [i for i, n in enumerate(search_clicks) if n][-1]
+    elif isinstance(triggered, dict) and ctx.triggered[0]["value"]:
+        idx = triggered["index"]
         weight = weights[idx]
         food = search_data[idx]
 
@@ -142,60 +222,101 @@ def handle_meals(manual_clicks, search_clicks, meal_name, calories, weights, sea
             (nutr["value"] for nutr in food.get("foodNutrients", []) if nutr["nutrientName"] == "Energy"), 0
         )
         total_kcal = round(kcal_per_100g * weight / 100, 1)
-        save_meal(current_user.id, food_name, total_kcal)
+        logged_at = save_meal(current_user.id, food_name, total_kcal)
+        row = {"Meal": food_name, "Calories": float(total_kcal)}
         msg = f"✅ Logged {weight}g of {food_name} ({total_kcal} kcal)"
 
-    # Fetch meals + build table/graph (same as before)
-    data = get_user_meals()
-    data_sorted = sorted(data, key=lambda row: row["Date"])
-    
-    import plotly.graph_objects as go
-    import pandas as pd
-    
-    df = pd.DataFrame(data_sorted)
-    if not df.empty:
-        df["Date"] = pd.to_datetime(df["Date"]).dt.date.astype(str)
-        daily_totals = df.groupby("Date")["Calories"].sum().reset_index()
-        daily_totals["Date"] = pd.to_datetime(daily_totals["Date"]).dt.date.astype(str)
-        fig = go.Figure(go.Scatter(
-            x=daily_totals["Date"],
-            y=daily_totals["Calories"],
-            mode="lines+markers",
-            line=dict(shape="spline", smoothing=1.3, width=3),
-            marker=dict(size=6)
-        ))
-        fig.update_layout(
-            xaxis_type="category",
-            xaxis_title="Date",
-            yaxis_title="Calories",
-            margin=dict(l=20, r=20, t=30, b=20),
-            template="simple_white"
-        )
     else:
-        fig = go.Figure()
+        raise PreventUpdate
+
+    # Only the tail of the chart (this day and the one it joins) can have changed
+    tail = get_calorie_tail(current_user.id, logged_at.date())
+    fig = Patch()
+    fig["data"][1]["x"] = [str(point["Date"]) for point in tail]
+    fig["data"][1]["y"] = [point["Calories"] for point in tail]
 
-    return msg, data_sorted, fig
+    row["Date"] = logged_at.strftime(DATE_FORMAT)
+    table, version, cursors = new_row_outputs(
+        MEALS_TABLE, row, version, page_current, page_size, sort_by, filter_query)
+    return msg, table, version, fig, cursors
 
 
+@dash.callback(
+    Output("meals-table", "data"),
+    Output("meals-table", "page_count"),
+    Output("meals-table-cursors", "data"),
+    Input("meals-table", "page_current"),
+    Input("meals-table", "page_size"),
+    Input("meals-table", "sort_by"),
+    Input("meals-table", "filter_query"),
+    Input("meals-version", "data"),
+    State("meals-table-cursors", "data"),
+)
+def update_meals_table(page_current, page_size, sort_by, filter_query, version, cursors):
+    if not (hasattr(current_user, "is_authenticated") and current_user.is_authenticated):
+        return [], 1, {}
+    return fetch_page(MEALS_TABLE, current_user.id, page_current, page_size, sort_by, filter_query, cursors, version)
+
+
+def _search_finished(foods, results):
+    """Outputs of search_food once a search is over: stop polling and reset the controls."""
+    return foods, results, None, True, "", False, {"display": "none"}
+
+
+# The search runs on the web process's bounded pool (see utils.background),
+# which keeps the USDA session, in-flight coalescing and database pool warm.
+# Pressing Search only queues it; the poll interval picks the result up, so no
+# request thread ever waits on USDA.
 @dash.callback(
     Output("food-search-store", "data"),
     Output("food-results", "children"),
+    Output("food-search-job", "data"),
+    Output("food-search-poll", "disabled"),
+    Output("food-search-status", "children"),
+    Output("search-btn", "disabled"),
+    Output("cancel-search-btn", "style"),
     Input("search-btn", "n_clicks"),
+    Input("food-search-poll", "n_intervals"),
+    Input("cancel-search-btn", "n_clicks"),
     State("food-query", "value"),
+    State("food-search-job", "data"),
     prevent_initial_call=True
 )
-def search_food(n_clicks, query):
-    if not query:
-        return [], dbc.Alert("Please enter a food name", color="warning")
-    
-    resp = query_usda_info(query)
-    if resp.status_code != 200:
-        return [], dbc.Alert("Error fetching data", color="danger")
-    
-    foods = resp.json().get("foods", [])
+def search_food(n_clicks, n_intervals, cancel_clicks, query, job_id):
+    triggered = ctx.triggered_id
+    if triggered == "search-btn":
+        if not query:
+            return _search_finished([], dbc.Alert("Please enter a food name", color="warning"))
+        try:
+            job_id = start_pooled("search", search_foods, query)
+        except QueueFull:
+            return _search_finished(
+                [], dbc.Alert("Search is busy right now, please try again in a moment", color="warning"))
+        return [], None, job_id, False, "🔎 Searching…", True, {"display": "inline-block"}
+
+    if triggered == "cancel-search-btn":
+        cancel_pooled(job_id)
+        return _search_finished(dash.no_update, None)
+
+    job = pooled_result(job_id)
+    if job is None or job["state"] == "cancelled":
+        return _search_finished([], None)
+    if job["state"] in ("queued", "running"):
+        if time.time() - job["started"] > SEARCH_TIMEOUT:
+            cancel_pooled(job_id)
+            return _search_finished(
+                [], dbc.Alert("Search is taking too long, please try again in a moment", color="warning"))
+        status = "⏳ Waiting for other searches to finish…" if job["state"] == "queued" else "🔎 Searching…"
+        return (dash.no_update,) * 4 + (status,) + (dash.no_update,) * 2
+    if job["state"] == "error":
+        if isinstance(job["error"], requests.RequestException):
+            return _search_finished([], dbc.Alert("Error fetching data", color="danger"))
+        return _search_finished([], dbc.Alert("❌ Search failed, please try again", color="danger"))
+
+    foods = job["result"]
     if not foods:
-        return [], dbc.Alert("No results found", color="info")
-    
+        return _search_finished([], dbc.Alert("No results found", color="info"))
+
     # Build cards with weight input + log button
     cards = []
     for idx, food in enumerate(foods):
@@ -216,6 +337,6 @@ def search_food(n_clicks, query):
                 className="mb-2"
             )
         )
-    return foods, dbc.Row([dbc.Col(c, width=12) for c in cards])
+    return _search_finished(foods, dbc.Row([dbc.Col(c, width=12) for c in cards]))
 
 layout = serve_layout
\ No newline at end of file
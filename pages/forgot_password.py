@@ -1,9 +1,7 @@
 import dash
 from dash import html, dcc, Input, Output, State
 import dash_bootstrap_components as dbc
-from utils.database_connection import create_reset_token
 from utils.emailer import send_reset_email
-import psycopg2
 
 dash.register_page(__name__, path="/forgot-password")
 
@@ -61,17 +59,7 @@ layout = dbc.Container(
     prevent_initial_call=True
 )
 def handle_reset_request(n, email):
-    from utils.database_connection import get_db_connection
-
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT username FROM users WHERE email = %s", (email,))
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
-
-    if user:
-        token = create_reset_token(user[0])
-        send_reset_email(email, token)
-
+    # Only queued: the account lookup, token and SMTP all happen on the mail
+    # worker, so the response looks the same whether or not the email exists
+    send_reset_email(email)
     return "✅ If that email exists, a reset link has been sent."
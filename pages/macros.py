@@ -1,44 +1,50 @@
 import dash
-from dash import Dash, dcc, html, Input, Output, State, dash_table
+from dash import Dash, dcc, html, Input, Output, State, dash_table, ClientsideFunction
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-import pandas as pd
-import plotly.graph_objects as go
 from datetime import datetime
-import psycopg2
 from utils.database_connection import get_db_connection
 from utils.login_handler import require_login
+from utils.aggregates import get_macro_totals
+from utils.pagination import table_spec, fetch_page
+from utils.cache import history_cache
+from utils.nutrition_summary import record_meal
+from utils import data_version
+from utils.export import export_links
+from utils.downsample import downsample, zoom_patch
+from utils.charts import MACRO_COLORS, build_history_figure
 from flask_login import current_user
-from dash import ctx
-import plotly.express as px
 
 
 dash.register_page(__name__)
 require_login(__name__)
 
 def save_meal(username, meal_name, protein, carbs, fat):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO macros_table (username, meal_name, protein, carbs, fats, date) VALUES (%s, %s, %s, %s, %s, %s)",
-        (username, meal_name, protein, carbs, fat, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
+    logged_at = datetime.now().replace(microsecond=0)
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO macros_table (username, meal_name, protein, carbs, fats, date) VALUES (%s, %s, %s, %s, %s, %s)",
+                (username, meal_name, protein, carbs, fat, logged_at)
+            )
+            record_meal(cur, username, logged_at, protein=protein, carbs=carbs, fat=fat)
+            version = data_version.bump(cur, username)
+    history_cache.written(username, version, "macros_table")
 
-def get_user_meals():
-    if not (hasattr(current_user, "is_authenticated") and current_user.is_authenticated):
-        return []
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT date, meal_name, protein, carbs, fats FROM macros_table WHERE username = %s ORDER BY date ASC",
-        (current_user.id,)
-    )
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return [{"Date": row[0].strftime('%Y-%m-%d %H:%M:%S'), "Meal": row[1], "Protein": row[2], "Carbs": row[3], "Fat": row[4]} for row in rows]
+MACRO_NAMES = ["Protein", "Carbs", "Fat"]
+MACRO_SERIES = [(name, name, MACRO_COLORS[name]) for name in MACRO_NAMES]
+
+def load_daily_macros(username, start=None, end=None):
+    """Daily macro totals as JSON-ready rows for the ``macro-daily`` store."""
+    return [dict(row, Date=str(row["Date"])) for row in get_macro_totals(username, start=start, end=end)]
+
+MACROS_TABLE = table_spec("macros_table", {
+    "Date": ("date", "timestamp"),
+    "Meal": ("meal_name", "text"),
+    "Protein": ("protein", "number"),
+    "Carbs": ("carbs", "number"),
+    "Fat": ("fats", "number"),
+})
 
 # -------------------
 # Layout
@@ -55,6 +61,12 @@ def serve_layout():
     fluid=True,
     className="p-3",
     children=[
+        dcc.Store(id="macro-version", data=0),
+        # Daily totals behind both charts; only refetched after a write
+        dcc.Store(id="macro-daily", data=load_daily_macros(current_user.id)),
+        dcc.Store(id="macro-line-width"),
+        dcc.Store(id="macro-table-cursors", data={}),
+
         # --- Add Meal Section ---
         dbc.Card(
             dbc.CardBody([
@@ -113,9 +125,18 @@ def serve_layout():
                         {"name": "Carbs (g)", "id": "Carbs"},
                         {"name": "Fat (g)", "id": "Fat"}
                     ],
+                    page_current=0,
+                    page_size=20,
+                    page_action="custom",
+                    sort_action="custom",
+                    sort_mode="single",
+                    sort_by=[{"column_id": "Date", "direction": "desc"}],
+                    filter_action="custom",
+                    filter_query="",
                     style_table={"overflowX": "auto"},
                     style_cell={"textAlign": "center", "minWidth": "80px"},
                 ),
+                export_links("macros"),
             ]),
             className="shadow-sm p-3"
         ),
@@ -137,74 +158,105 @@ def serve_layout():
 # ===================== Callbacks =====================
 @dash.callback(
     Output("macro-add-output", "children"),
-    Output("macro-table", "data"),
-    Output("macro-pie-chart", "children"),
-    Output("macro-line-chart", "figure"),
+    Output("macro-version", "data"),
+    Output("macro-daily", "data"),
     Output("macro-modal", "is_open"),
     Input("add-macro-btn", "n_clicks"),
-    Input("macro-date-picker", "date"),
     State("macro-meal-name", "value"),
     State("macro-protein", "value"),
     State("macro-carbs", "value"),
     State("macro-fat", "value"),
-    State("macro-modal", "is_open"),
+    State("macro-version", "data"),
+    prevent_initial_call=True
 )
-def update_macros(n_clicks, selected_date, meal, protein, carbs, fat, modal_open):
-    triggered = ctx.triggered_id
-    msg = dash.no_update
-
-    # Fetch meals
-    meals = get_user_meals()
-    df = pd.DataFrame(meals)
-
-    # Add meal if button pressed
-    if triggered == "add-macro-btn":
-        if not meal or protein is None or carbs is None or fat is None:
-            return msg, dash.no_update, dash.no_update, dash.no_update, True
-
-        save_meal(current_user.id, meal, protein, carbs, fat)
-        msg = f"✅ Added {meal}"
-        meals = get_user_meals()
-        df = pd.DataFrame(meals)
-
-    if df.empty:
-        return msg, [], None, {}, False
-
-    # Normalize date column
-    df["Day"] = pd.to_datetime(df["Date"]).dt.date
-
-    # Pie chart for selected date
-    pie_chart = None
-    if selected_date:
-        sel_date = pd.to_datetime(selected_date).date()
-        day_df = df[df["Day"] == sel_date]
-        if not day_df.empty:
-            totals = day_df[["Protein", "Carbs", "Fat"]].sum()
-            pie = px.pie(
-                names=totals.index, values=totals.values,
-                title=f"Macros for {sel_date}"
-            )
-            pie.update_traces(textinfo="percent+label")
-            pie_chart = dcc.Graph(figure=pie, config={"displayModeBar": False})
-
-    # Line chart (all days)
-    daily = df.groupby("Day", as_index=False)[["Protein", "Carbs", "Fat"]].sum()
-    line_chart = px.line(
-        daily,
-        x="Day",
-        y=["Protein", "Carbs", "Fat"],
-        title="Daily Macros Over Time"
+def add_macros(n_clicks, meal, protein, carbs, fat, version):
+    if not meal or protein is None or carbs is None or fat is None:
+        return dash.no_update, dash.no_update, dash.no_update, True
+
+    save_meal(current_user.id, meal, protein, carbs, fat)
+    return f"✅ Added {meal}", (version or 0) + 1, load_daily_macros(current_user.id), False
+
+
+@dash.callback(
+    Output("macro-pie-chart", "children"),
+    Input("macro-date-picker", "date"),
+    Input("macro-daily", "data"),
+)
+def update_macro_pie(selected_date, daily):
+    # Looked up in the store, so browsing dates never queries the database
+    if not selected_date or not daily:
+        return None
+    # The picker sends "YYYY-MM-DD", or a full ISO timestamp for the initial value
+    sel_date = selected_date[:10]
+    totals = next((row for row in daily if row["Date"] == sel_date), None)
+    if totals is None:
+        return None
+
+    macros = {name: totals[name] for name in MACRO_NAMES}
+    import plotly.express as px  # heavy; loaded the first time a pie is drawn
+    pie = px.pie(
+        names=list(macros), values=list(macros.values()),
+        title=f"Macros for {sel_date}"
     )
-    line_chart.update_layout(yaxis_title="Grams")
-    line_chart.update_layout(
-        xaxis=dict(
-            tickformat="%Y-%m-%d",  # show only date
-            dtick="D1"               # one day between ticks
-        )
+    pie.update_traces(textinfo="percent+label")
+    return dcc.Graph(figure=pie, config={"displayModeBar": False})
+
+
+dash.clientside_callback(
+    ClientsideFunction(namespace="charts", function_name="graphWidth"),
+    Output("macro-line-width", "data"),
+    Input("macro-line-chart", "id"),
+)
+
+
+@dash.callback(
+    Output("macro-line-chart", "figure"),
+    Input("macro-daily", "data"),
+    Input("macro-line-width", "data"),
+)
+def update_macro_line(daily, width):
+    if not daily:
+        return {}
+
+    # Line chart (all days), summed per day in SQL and downsampled to the chart width
+    line_chart = build_history_figure(
+        downsample(daily, width, MACRO_NAMES), MACRO_SERIES, "Grams", title="Daily Macros Over Time",
+        uirevision="macros",
     )
+    line_chart.update_layout(xaxis_tickformat="%Y-%m-%d")  # show only date
+    return line_chart
+
+
+@dash.callback(
+    Output("macro-line-chart", "figure", allow_duplicate=True),
+    Input("macro-line-chart", "relayoutData"),
+    State("macro-line-width", "data"),
+    prevent_initial_call=True
+)
+def zoom_macro_line(relayout, width):
+    # One trace per macro, in MACRO_NAMES order
+    fig = zoom_patch(
+        relayout, lambda start, end: load_daily_macros(current_user.id, start, end), width, MACRO_NAMES)
+    if fig is None:
+        raise PreventUpdate
+    return fig
 
 
-    return msg, df.to_dict("records"), pie_chart, line_chart, False
+@dash.callback(
+    Output("macro-table", "data"),
+    Output("macro-table", "page_count"),
+    Output("macro-table-cursors", "data"),
+    Input("macro-table", "page_current"),
+    Input("macro-table", "page_size"),
+    Input("macro-table", "sort_by"),
+    Input("macro-table", "filter_query"),
+    Input("macro-version", "data"),
+    State("macro-table-cursors", "data"),
+)
+def update_macro_table(page_current, page_size, sort_by, filter_query, version, cursors):
+    if not (hasattr(current_user, "is_authenticated") and current_user.is_authenticated):
+        return [], 1, {}
+    return fetch_page(MACROS_TABLE, current_user.id, page_current, page_size, sort_by, filter_query, cursors, version)
 
 
 # --- Close Modal Helper ---
@@ -1,5 +1,5 @@
 import dash
-from dash import html, Input, Output, State
+from dash import html, Input, Output, State, ClientsideFunction
 import dash_bootstrap_components as dbc
 
 dash.register_page(__name__)
@@ -61,8 +61,9 @@ layout = dbc.Container(
     ]
 )
 
-# 1RM calculation callback
-@dash.callback(
+# 1RM calculation callback (runs in the browser, see assets/calculators.js)
+dash.clientside_callback(
+    ClientsideFunction(namespace="calculators", function_name="oneRepMax"),
     Output("orm-result", "children"),
     Input("orm-calc-btn", "n_clicks"),
     State("orm-exercise", "value"),
@@ -71,15 +72,3 @@ layout = dbc.Container(
     State("orm-reps", "value"),
     prevent_initial_call=True
 )
-def calculate_1rm(n, exercise, units, weight, reps):
-    if not weight or not reps:
-        return "⚠️ Please enter both weight and reps."
-
-    # Epley formula
-    one_rm = weight * (1 + reps / 30)
-
-    unit_label = "kg" if units == "metric" else "lbs"
-
-    exercise_name = {"bench": "Bench Press", "squat": "Squat", "deadlift": "Deadlift"}[exercise]
-
-    return f"{exercise_name} estimated 1RM: {one_rm:.1f} {unit_label}"
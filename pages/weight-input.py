@@ -1,58 +1,115 @@
 import dash
-from dash import html, dcc, Input, Output, State, dash_table
+from dash import html, dcc, Input, Output, State, dash_table, Patch, ClientsideFunction
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-import pandas as pd
-import io
-import base64
-from datetime import datetime
-import psycopg2
+from datetime import datetime, timedelta
 from flask_login import current_user
-from utils.database_connection import get_db_connection
+from utils.database_connection import get_db_connection, fetch_columns
 from utils.login_handler import require_login
-from dash import ctx
-import plotly.graph_objects as go
+from utils.weight_import import read_upload, import_weights
+from utils.pagination import table_spec, fetch_page, new_row_outputs
+from utils.cache import history_cache, cached
+from utils import data_version
+from utils.export import export_links
+from utils.downsample import chart_points, lttb
+from utils.charts import LINE_COLOR, build_history_figure, overlay_line
+from utils.weight_trend import load_trend, record_weight
+from utils.background import QueueFull, job_slot, submit_job, claim_job
+from utils.metrics import job_metrics
 
 dash.register_page(__name__)
 require_login(__name__)
 
-def add_weight_to_db(weight_kg):
-    """Add a single weight entry for the current user."""
+def add_weight_to_db(weight_kg, logged_at=None):
+    """Add a single weight entry for the current user.
+
+    Returns ``(ok, detail)``: on success the cache generation ``record_weight``
+    folds the entry in with, otherwise the error message.
+    """
     if not (hasattr(current_user, "is_authenticated") and current_user.is_authenticated):
         return False, "User not authenticated."
 
-    conn = get_db_connection()
-    cur = conn.cursor()
     try:
-        cur.execute(
-            "INSERT INTO bodyweight (username, weight_kg) VALUES (%s, %s)",
-            (current_user.id, weight_kg),
-        )
-        conn.commit()
-        return True, "✅ Weight added successfully!"
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO bodyweight (username, weight_kg, created_at) VALUES (%s, %s, %s)",
+                    (current_user.id, weight_kg, logged_at or datetime.now()),
+                )
+                version = data_version.bump(cur, current_user.id)
+        return True, history_cache.written(current_user.id, version, "bodyweight")
     except Exception as e:
-        conn.rollback()
         return False, f"❌ Database error: {e}"
-    finally:
-        cur.close()
-        conn.close()
+
+# Weight history is handled as columns: a datetime64 "Date" array and a
+# float64 "Weight" array in kg, straight from fetch_columns
+WEIGHT_COLUMNS = [("Date", "datetime64[ms]"), ("Weight", "float64")]
 
 def get_user_weights():
-    """Fetch all weight entries for the current user."""
+    """Fetch all weight entries (kg) for the current user as columns, oldest first."""
     if not (hasattr(current_user, "is_authenticated") and current_user.is_authenticated):
-        return []
+        return history_columns(None)
+    return load_user_weights(current_user.id)
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            "SELECT created_at, weight_kg FROM bodyweight WHERE username = %s ORDER BY created_at DESC",
-            (current_user.id,),
-        )
-        rows = cur.fetchall()
-        return [{"Date": r[0].strftime("%Y-%m-%d %H:%M"), "Weight": float(r[1])} for r in rows]
-    finally:
-        cur.close()
-        conn.close()
+@cached("bodyweight")
+def load_user_weights(username):
+    return fetch_columns(
+        'SELECT created_at AS "Date", weight_kg AS "Weight" FROM bodyweight WHERE username = %s ORDER BY created_at',
+        (username,), WEIGHT_COLUMNS,
+    )
+
+def history_store(columns, trend):
+    """Weight columns and their ``WeightTrend`` as the JSON ``weight-history`` store.
+
+    Entries are epoch ms and kg lists; ``"trend"`` holds ``trend.columns()`` in kg.
+    """
+    return {
+        "Date": columns["Date"].astype("int64").tolist(),
+        "Weight": columns["Weight"].tolist(),
+        "trend": trend.columns(),
+    }
+
+def history_columns(store):
+    """The ``weight-history`` store (or None) back as weight columns."""
+    import numpy as np
+    store = store if isinstance(store, dict) else {}
+    return {
+        "Date": np.asarray(store.get("Date", []), dtype=np.int64).view("datetime64[ms]"),
+        "Weight": np.asarray(store.get("Weight", []), dtype=np.float64),
+    }
+
+def get_weight_tail(username, day):
+    """Daily average weight (kg) for ``day`` and the last weighed day before it, as columns."""
+    start = datetime.combine(day, datetime.min.time())
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT MAX(created_at) FROM bodyweight WHERE username = %s AND created_at < %s",
+                (username, start),
+            )
+            previous = cur.fetchone()[0]
+            days = ([previous.date()] if previous else []) + [day]
+
+            tail = {"Date": [], "Weight": []}
+            for tail_day in days:
+                tail_start = datetime.combine(tail_day, datetime.min.time())
+                cur.execute(
+                    "SELECT AVG(weight_kg) FROM bodyweight WHERE username = %s AND created_at >= %s AND created_at < %s",
+                    (username, tail_start, tail_start + timedelta(days=1)),
+                )
+                average = cur.fetchone()[0]
+                if average is not None:
+                    tail["Date"].append(str(tail_day))
+                    tail["Weight"].append(float(average))
+    return tail
+
+def weight_table_spec(unit):
+    """Table columns with the weight already converted to the display unit."""
+    factor = 2.20462 if unit == "lbs" else 1
+    return table_spec("bodyweight", {
+        "Date": ("created_at", "timestamp"),
+        "Weight": (f"round((weight_kg * {factor})::numeric, 2)", "number"),
+    }, date_format="%Y-%m-%d %H:%M")
 
 # --- Dash App ---
 
@@ -64,10 +121,20 @@ def serve_layout():
             " to continue"
         ])
     else:
+        history = get_user_weights()
+        trend = load_trend(current_user.id)
         return dbc.Container(
                 fluid=True,
                 className="p-3",
                 children=[
+                    dcc.Store(id="weight-version", data=0),
+                    dcc.Store(id="weight-table-cursors", data={}),
+                    # Raw history and trend in kg; the browser draws the chart from it
+                    # (charts.weightFigure) and only writes refresh it
+                    dcc.Store(id="weight-history", data=history_store(history, trend)),
+                    dcc.Store(id="weight-graph-width"),
+                    dcc.Store(id="upload-job"),
+                    dcc.Store(id="upload-done"),
                     dbc.Card(
                         className="shadow-sm p-3 mb-4",
                         children=[
@@ -116,6 +183,11 @@ def serve_layout():
                                 },
                                 multiple=False
                             ),
+                            dbc.Progress(id="upload-progress", value=0, className="mt-2", style={"display": "none"}),
+                            dbc.Button(
+                                "Cancel upload", id="cancel-upload-btn", color="secondary", size="sm",
+                                className="mt-2", style={"display": "none"},
+                            ),
                             html.Div(id="upload-output", className="text-info text-center mt-2"),
                         ]
                     ),
@@ -146,6 +218,7 @@ def serve_layout():
                             ),
                             dcc.Graph(
                                 id="weight-graph",
+                                figure=build_weight_figure(),
                                 config={"displayModeBar": False},
                                 style={"height": "300px", "width": "100%"},
                             ),
@@ -155,6 +228,14 @@ def serve_layout():
                                     {"name": "Date", "id": "Date"},
                                     {"name": "Weight", "id": "Weight"},
                                 ],
+                                page_current=0,
+                                page_size=20,
+                                page_action="custom",
+                                sort_action="custom",
+                                sort_mode="single",
+                                sort_by=[{"column_id": "Date", "direction": "desc"}],
+                                filter_action="custom",
+                                filter_query="",
                                 style_table={"overflowX": "auto"},
                                 style_cell={
                                     "textAlign": "center",
@@ -163,6 +244,7 @@ def serve_layout():
                                     "whiteSpace": "normal"
                                 },
                             ),
+                            export_links("weight"),
                         ]
                     ),
                 ]
@@ -170,117 +252,256 @@ def serve_layout():
 
 
 def convert_weights(weights, unit):
-    """Convert weight list from kg to preferred unit for display."""
-    converted = []
-    for w in weights:
-        if unit == "lbs":
-            converted.append({
-                "Date": w["Date"],
-                "Weight": round(w["Weight"] * 2.20462, 2)
-            })
-        else:
-            converted.append({
-                "Date": w["Date"],
-                "Weight": round(w["Weight"], 2)
-            })
-    return converted
+    """Convert kg weights (an array or list) to the display unit, rounded to 2 dp, as an array."""
+    import numpy as np
+    factor = 2.20462 if unit == "lbs" else 1
+    return np.round(np.asarray(weights, dtype=np.float64) * factor, 2)
 
 def convert_to_kg(weight):
     return round(weight / 2.20462, 2)
 
 
+WEIGHT_SERIES = [("Weight", "Weight", LINE_COLOR)]
+# Drawn after the history and tail traces, so overlay i is data[2 + i]
+TREND_OVERLAYS = [
+    ("Trend", "Trend", "#ff7f0e", "solid"),
+    ("Avg7", "7-day average", "#2ca02c", "dot"),
+    ("Avg30", "30-day average", "#9467bd", "dash"),
+]
+
+
+def _trend_in_unit(columns, display_unit):
+    """Trend columns (kg, from the store) in ``display_unit``."""
+    factor = 2.20462 if display_unit == "lbs" else 1
+    return {
+        key: values if key == "Date" else [None if v is None else round(v * factor, 2) for v in values]
+        for key, values in columns.items()
+    }
+
+
+def _overlay_xy(columns, key, width):
+    """One trend line's x and y lists, downsampled like charts.weightFigure does it."""
+    import numpy as np
+    x = np.array(columns["Date"], dtype="datetime64[ms]").astype(np.float64)
+    keep = lttb(x, columns[key], chart_points(width)).tolist()
+    return [columns["Date"][i] for i in keep], [columns[key][i] for i in keep]
+
+
+def _trend_title(columns, display_unit):
+    """Latest trend weight and weekly change, e.g. "Trend 82.4 kg (-0.35 kg/week)"."""
+    if not columns["Date"]:
+        return ""
+    title = f"Trend {columns['Trend'][-1]:.1f} {display_unit}"
+    if columns["Rate"][-1] is not None:
+        title += f" ({columns['Rate'][-1]:+.2f} {display_unit}/week)"
+    return title
+
+
+def build_weight_figure():
+    """The weight chart with its traces and layout but no points.
+
+    charts.weightFigure (assets/charts.js) fills it in from the
+    ``weight-history`` store: data[0] is the downsampled history, data[1] the
+    list-backed tail from the last point before today (so logging a weight
+    only has to patch it, see add_weight) and data[2:] the ``TREND_OVERLAYS``.
+    """
+    overlays = [overlay_line([], [], name, color, dash) for _, name, color, dash in TREND_OVERLAYS]
+    return build_history_figure(
+        history_columns(None), WEIGHT_SERIES, "Weight (kg)", tail=[], title="", overlays=overlays,
+        uirevision="weight",
+    )
+
+
 @dash.callback(
     Output("weight-output", "children"),
-    Output("upload-output", "children"),
-    Output("weight-table", "data"),
-    Output("weight-graph", "figure"),
+    Output("weight-graph", "figure", allow_duplicate=True),
+    Output("weight-table", "data", allow_duplicate=True),
+    Output("weight-version", "data", allow_duplicate=True),
+    Output("weight-history", "data", allow_duplicate=True),
+    Output("weight-table-cursors", "data", allow_duplicate=True),
     Input("add-weight-btn", "n_clicks"),
     State("weight-input", "value"),
     State("unit-select", "value"),
+    State("history-unit-select", "value"),
+    State("graph-view-mode", "value"),
+    State("weight-graph-width", "data"),
+    State("weight-version", "data"),
+    State("weight-table", "page_current"),
+    State("weight-table", "page_size"),
+    State("weight-table", "sort_by"),
+    State("weight-table", "filter_query"),
+    prevent_initial_call=True
+)
+def add_weight(n_clicks, weight, unit, display_unit, view_mode, width, version,
+               page_current, page_size, sort_by, filter_query):
+    if not weight:
+        raise PreventUpdate
+
+    if unit == 'lbs':
+        weight = convert_to_kg(weight)
+    logged_at = datetime.now().replace(microsecond=0)
+    ok, detail = add_weight_to_db(weight, logged_at)
+    if not ok:
+        return detail, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+
+    history = Patch()
+    history["Date"].append((logged_at - datetime(1970, 1, 1)) // timedelta(milliseconds=1))
+    history["Weight"].append(weight)
+
+    shown = float(convert_weights([weight], display_unit)[0])
+    fig = Patch()
+    if view_mode == "avg":
+        # Today's average changed; replace the tail with the fresh averages
+        tail = get_weight_tail(current_user.id, logged_at.date())
+        fig["data"][1]["x"] = tail["Date"]
+        fig["data"][1]["y"] = convert_weights(tail["Weight"], display_unit).tolist()
+    else:
+        fig["data"][1]["x"].append(logged_at.strftime("%Y-%m-%d %H:%M"))
+        fig["data"][1]["y"].append(shown)
+
+    # Only the weigh-in's day of the trend lines changes: append it when it is
+    # the day's first weigh-in, otherwise overwrite the day's last point
+    # The store keeps the trend in kg for later redraws, the chart in the display unit
+    trend = record_weight(current_user.id, logged_at, weight, detail)
+    stored = trend.columns()
+    columns = _trend_in_unit(stored, display_unit)
+    if trend.days[-1] != logged_at.date():
+        # The history has entries dated after today (from an upload); redraw the lines
+        history["trend"] = stored
+        for i, (key, *_) in enumerate(TREND_OVERLAYS, start=2):
+            fig["data"][i]["x"], fig["data"][i]["y"] = _overlay_xy(columns, key, width)
+    elif trend.last_day_is_new():
+        for key, values in stored.items():
+            history["trend"][key].append(values[-1])
+        for i, (key, *_) in enumerate(TREND_OVERLAYS, start=2):
+            fig["data"][i]["x"].append(columns["Date"][-1])
+            fig["data"][i]["y"].append(columns[key][-1])
+    else:
+        for key, values in stored.items():
+            history["trend"][key][-1] = values[-1]
+        for i, (key, *_) in enumerate(TREND_OVERLAYS, start=2):
+            fig["data"][i]["y"][-1] = columns[key][-1]
+    fig["layout"]["title"]["text"] = _trend_title(columns, display_unit)
+
+    spec = weight_table_spec(display_unit)
+    table, version, cursors = new_row_outputs(
+        spec, {"Date": logged_at.strftime(spec["date_format"]), "Weight": shown}, version,
+        page_current, page_size, sort_by, filter_query)
+    return "✅ Weight added!", fig, table, version, history, cursors
+
+
+# Bulk uploads are parsed and inserted by a background job. The job has no
+# request (and so no current_user), so this callback files the upload under
+# the user's name and hands the job only an unguessable id for it.
+@dash.callback(
+    Output("upload-job", "data"),
+    Output("upload-output", "children"),
     Input("upload-data", "contents"),
     State("upload-data", "filename"),
-    Input("history-unit-select", "value"),
-    Input("graph-view-mode", "value")
-    )
-def update_page(n_clicks, weight, unit, uploaded_contents, filename, display_unit, view_mode):
-    msg = ""
-    upload_msg = ""
-
-    # Add weight manually
-    if n_clicks and weight:
-        if unit == 'lbs':
-            weight = convert_to_kg(weight)
-        add_weight_to_db(weight)  # hardcoded user_id=1
-        msg = "✅ Weight added!"
-
-    # Handle bulk upload
-    if uploaded_contents:
-        content_type, content_string = uploaded_contents.split(",")
-        decoded = base64.b64decode(content_string)
-        try:
-            if filename.endswith(".csv"):
-                df = pd.read_csv(io.StringIO(decoded.decode("utf-8")))
-            else:
-                df = pd.read_excel(io.BytesIO(decoded))
-
-            for _, row in df.iterrows():
-                add_weight_to_db(row.get("Unit", "kg"))
-            upload_msg = "✅ Bulk upload successful!"
-        except Exception as e:
-            upload_msg = f"❌ Upload failed: {e}"
-
-    # Get all weights from DB
-    data = convert_weights(get_user_weights(), display_unit)
-    data = sorted(data, key=lambda row: row["Date"])
-
-    # Build graph
-    fig = go.Figure()
-    if data:
-        if view_mode == "avg":
-            df = pd.DataFrame(data)
-            # Ensure datetime
-            df["Date"] = pd.to_datetime(df['Date']).dt.date
-            # Strip time, group by day
-            daily_avg = df.groupby('Date').mean().reset_index()
-            # Convert dates to strings for categorical x-axis
-            daily_avg["Date"] = daily_avg["Date"].astype(str)
-
-            fig.add_trace(
-                go.Scatter(
-                    x=daily_avg["Date"],
-                    y=daily_avg["Weight"],
-                    mode="lines+markers",
-                    line=dict(shape="spline", smoothing=1.3, width=3),
-                    marker=dict(size=6)
-                )
-            )
-            fig.update_layout(
-                xaxis_type='category',
-                xaxis_title="Date",
-                yaxis_title=f"Weight ({display_unit})",
-                margin=dict(l=20, r=20, t=30, b=20),
-                template="simple_white"
-            )
+    prevent_initial_call=True
+)
+def queue_upload(uploaded_contents, filename):
+    if not uploaded_contents or not (hasattr(current_user, "is_authenticated") and current_user.is_authenticated):
+        raise PreventUpdate
+    job_id = submit_job({"username": current_user.id, "contents": uploaded_contents, "filename": filename})
+    return job_id, "⏳ Upload queued…"
 
-        else:
-            fig.add_trace(
-                go.Scatter(
-                    x=[row["Date"] for row in data],
-                    y=[row["Weight"] for row in data],
-                    mode="lines+markers",
-                    line=dict(shape="spline", smoothing=1.3, width=3),
-                    marker=dict(size=6)
-                )
-            )
 
-        fig.update_layout(
-            margin=dict(l=20, r=20, t=30, b=20),
-            xaxis_title="Date",
-            yaxis_title=f"Weight ({display_unit})",
-            template="simple_white",
-        )
+@dash.callback(
+    Output("upload-output", "children", allow_duplicate=True),
+    Output("weight-history", "data", allow_duplicate=True),
+    Output("upload-done", "data"),
+    Input("upload-job", "data"),
+    background=True,
+    progress=[Output("upload-progress", "value"), Output("upload-progress", "label")],
+    running=[
+        (Output("upload-data", "disabled"), True, False),
+        (Output("upload-progress", "style"), {}, {"display": "none"}),
+        (Output("cancel-upload-btn", "style"), {}, {"display": "none"}),
+    ],
+    cancel=[Input("cancel-upload-btn", "n_clicks")],
+    prevent_initial_call=True
+)
+@job_metrics()
+def upload_weights(set_progress, job_id):
+    job = claim_job(job_id)
+    if job is None:
+        return "❌ Upload expired, please try again", dash.no_update, dash.no_update
+    username = job["username"]
+
+    try:
+        with job_slot("upload", on_wait=lambda: set_progress((5, "Waiting for other uploads…"))):
+            set_progress((20, "Reading file…"))
+            df = read_upload(job["contents"], job["filename"])
+            set_progress((50, f"Importing {len(df)} rows…"))
+            accepted, rejected = import_weights(username, df)
+    except QueueFull:
+        return "⚠️ Too many uploads in progress, please try again shortly", dash.no_update, dash.no_update
+    except Exception as e:
+        return f"❌ Upload failed: {e}", dash.no_update, dash.no_update
 
-    return msg, upload_msg, data, fig
+    upload_msg = f"✅ Imported {accepted} entries"
+    if rejected:
+        upload_msg += f", skipped {rejected} invalid rows"
+
+    # A bulk import can touch any part of the history, so store (and with it
+    # the chart) and table reload
+    set_progress((90, "Refreshing chart…"))
+    return upload_msg, history_store(load_user_weights(username), load_trend(username)), job_id
+
+
+@dash.callback(
+    Output("weight-version", "data", allow_duplicate=True),
+    Input("upload-done", "data"),
+    State("weight-version", "data"),
+    prevent_initial_call=True
+)
+def finish_upload(job_id, version):
+    # The import ran in the job's process and bumped the data version, so this
+    # worker's cache drops its copy when the table re-reads its page
+    return (version or 0) + 1
+
+
+dash.clientside_callback(
+    ClientsideFunction(namespace="charts", function_name="graphWidth"),
+    Output("weight-graph-width", "data"),
+    Input("weight-graph", "id"),
+)
+
+
+# Unit, view, width and zoom changes redraw in the browser from the store.
+# Adding a weight patches store and chart itself, so the store is only a State
+# here; an upload replaces the store and then sets upload-done.
+dash.clientside_callback(
+    ClientsideFunction(namespace="charts", function_name="weightFigure"),
+    Output("weight-graph", "figure"),
+    Input("history-unit-select", "value"),
+    Input("graph-view-mode", "value"),
+    Input("weight-graph-width", "data"),
+    Input("upload-done", "data"),
+    Input("weight-graph", "relayoutData"),
+    State("weight-history", "data"),
+    State("weight-graph", "figure"),
+)
+
+
+@dash.callback(
+    Output("weight-table", "data"),
+    Output("weight-table", "page_count"),
+    Output("weight-table-cursors", "data"),
+    Input("weight-table", "page_current"),
+    Input("weight-table", "page_size"),
+    Input("weight-table", "sort_by"),
+    Input("weight-table", "filter_query"),
+    Input("history-unit-select", "value"),
+    Input("weight-version", "data"),
+    State("weight-table-cursors", "data"),
+)
+def update_weight_table(page_current, page_size, sort_by, filter_query, display_unit, version, cursors):
+    if not (hasattr(current_user, "is_authenticated") and current_user.is_authenticated):
+        return [], 1, {}
+    spec = weight_table_spec(display_unit)
+    return fetch_page(spec, current_user.id, page_current, page_size, sort_by, filter_query, cursors, version)
 
 
 layout = serve_layout
\ No newline at end of file
@@ -0,0 +1,116 @@
+import pickle
+import threading
+
+import pytest
+
+from utils import cache as cache_module
+from utils.cache import UserCache
+
+
+class Loader:
+    """Counts how often a value had to be loaded."""
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = UserCache(max_entries=2)
+    cache.get_or_load("u", "t", 1, Loader("one"))
+    cache.get_or_load("u", "t", 2, Loader("two"))
+    cache.get_or_load("u", "t", 1, Loader("one again"))  # 1 is now the most recent
+    cache.get_or_load("u", "t", 3, Loader("three"))
+
+    assert cache.get_or_load("u", "t", 1, Loader("reloaded")) == "one"
+    reload = Loader("two reloaded")
+    assert cache.get_or_load("u", "t", 2, reload) == "two reloaded"
+    assert reload.calls == 1
+    assert cache.stats()["evictions"] >= 1
+
+
+def test_byte_cap_evicts_old_entries_and_skips_oversized_ones():
+    value = "x" * 1000
+    size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    cache = UserCache(max_bytes=size * 2)
+    for key in range(3):
+        cache.get_or_load("u", "t", key, Loader(value))
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes"] <= size * 2
+
+    huge = Loader("y" * size * 3)
+    cache.get_or_load("u", "t", "huge", huge)
+    cache.get_or_load("u", "t", "huge", huge)
+    assert huge.calls == 2  # never stored
+    assert cache.stats()["entries"] == 2
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = UserCache(ttl=60)
+    loader = Loader("value")
+    cache.get_or_load("u", "t", (), loader)
+    clock[0] += 59
+    cache.get_or_load("u", "t", (), loader)
+    assert loader.calls == 1
+    clock[0] += 2
+    cache.get_or_load("u", "t", (), loader)
+    assert loader.calls == 2
+
+
+def test_invalidation_during_a_load_keeps_the_stale_value_out():
+    cache = UserCache()
+    loading, written = threading.Event(), threading.Event()
+
+    def slow_load():
+        loading.set()
+        written.wait(5)
+        return "read before the write"
+
+    reader = threading.Thread(target=lambda: cache.get_or_load("u", "t", (), slow_load))
+    reader.start()
+    loading.wait(5)
+    cache.invalidate("u", "t")
+    written.set()
+    reader.join(5)
+
+    fresh = Loader("read after the write")
+    assert cache.get_or_load("u", "t", (), fresh) == "read after the write"
+    assert fresh.calls == 1
+
+
+def test_sync_drops_entries_read_at_another_version():
+    cache = UserCache()
+    cache.sync("u", 1)
+    cache.get_or_load("u", "t", (), Loader("old"))
+    cache.sync("u", 1)
+    assert cache.get_or_load("u", "t", (), Loader("new")) == "old"
+    cache.sync("u", 2)  # written by another worker
+    assert cache.get_or_load("u", "t", (), Loader("new")) == "new"
+
+
+def test_written_keeps_other_entries_only_after_the_previous_version():
+    cache = UserCache()
+    cache.sync("u", 1)
+    cache.get_or_load("u", "meals", (), Loader("meals"))
+    cache.get_or_load("u", "trend", (), Loader("trend"))
+
+    generation = cache.written("u", 2, "meals")
+    assert generation is not None
+    assert cache.update("u", "trend", (), lambda trend: trend + " + weigh-in", generation)
+    assert cache.get_or_load("u", "trend", (), Loader("reloaded")) == "trend + weigh-in"
+    assert cache.get_or_load("u", "meals", (), Loader("meals reloaded")) == "meals reloaded"
+
+    # Version 3 was written elsewhere, so nothing read at 2 can be kept
+    assert cache.written("u", 4, "meals") is None
+    assert cache.get_or_load("u", "trend", (), Loader("reloaded")) == "reloaded"
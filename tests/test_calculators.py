@@ -0,0 +1,75 @@
+import itertools
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from utils.calculators import calculate_1rm, calculate_bmi, calculate_bmr
+
+NODE = shutil.which("node")
+SCRIPT = os.path.join(os.path.dirname(__file__), "..", "assets", "calculators.js")
+
+pytestmark = pytest.mark.skipif(NODE is None, reason="needs node to run assets/calculators.js")
+
+
+def run_js(name, calls):
+    """Call ``dash_clientside.calculators[name]`` once per argument list, under node."""
+    with open(SCRIPT, encoding="utf-8") as f:
+        source = f.read()
+    runner = (
+        "var window = {};\n" + source + "\n"
+        "var calls = JSON.parse(require('fs').readFileSync(0, 'utf8'));\n"
+        f"var fn = window.dash_clientside.calculators[{json.dumps(name)}];\n"
+        "process.stdout.write(JSON.stringify(calls.map(function (args) { return fn.apply(null, args); })));\n"
+    )
+    result = subprocess.run(
+        [NODE, "-e", runner], input=json.dumps(calls), capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout)
+
+
+def test_bmi_matches_python():
+    calls = [
+        ["metric", h, w, None, None, None]
+        for h, w in itertools.product([None, 0, 150, 165.5, 172, 190], [None, 45, 61.7, 72.3, 90, 130])
+    ] + [
+        ["imperial", None, None, ft, inch, lb]
+        for ft, inch, lb in itertools.product([None, 5, 6], [None, 0, 3.5, 11], [None, 110, 154.3, 210, 300])
+    ]
+    expected = [calculate_bmi(*args) for args in calls]
+    assert run_js("bmi", [[1] + args for args in calls]) == expected
+
+
+@pytest.mark.parametrize("bmi, category", [
+    (18.49, "Underweight"), (18.5, "Normal weight"), (24.95, "Normal weight"),
+    (25, "Overweight"), (29.95, "Overweight"), (30, "Obesity"),
+])
+def test_bmi_bands_have_no_gaps(bmi, category):
+    # 1 m tall, so the weight in kg is the BMI
+    assert calculate_bmi("metric", 100, bmi, None, None, None).endswith(f"({category})")
+    assert run_js("bmi", [[1, "metric", 100, bmi, None, None, None]])[0].endswith(f"({category})")
+
+
+def test_bmr_matches_python():
+    calls = [
+        ["metric", gender, age, h, None, None, w, None, activity]
+        for gender, age, h, w, activity in itertools.product(
+            ["male", "female"], [None, 25, 40], [None, 160, 170, 181.5], [None, 55, 72.4, 95], [1.2, 1.55, 1.9])
+    ] + [
+        ["imperial", gender, 33, None, ft, inch, None, lb, 1.375]
+        for gender, ft, inch, lb in itertools.product(["male", "female"], [None, 5, 6], [None, 0, 7], [None, 140, 185.5])
+    ]
+    expected = [calculate_bmr(*args) for args in calls]
+    assert run_js("bmr", [[1] + args for args in calls]) == expected
+
+
+def test_one_rep_max_matches_python():
+    calls = [
+        [exercise, units, weight, reps]
+        for exercise, units, weight, reps in itertools.product(
+            ["bench", "squat", "deadlift"], ["metric", "imperial"], [None, 0, 60, 102.5, 225], [None, 0, 1, 5, 8, 12])
+    ]
+    expected = [calculate_1rm(*args) for args in calls]
+    assert run_js("oneRepMax", [[1] + args for args in calls]) == expected
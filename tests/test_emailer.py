@@ -0,0 +1,146 @@
+import queue
+import socket
+import threading
+import time
+from email.mime.text import MIMEText
+
+import pytest
+
+from utils.emailer import MailWorker
+
+SENDER = "no-reply@example.com"
+
+
+class Recorder:
+    """aiosmtpd handler that keeps what it receives and can refuse the first tries of a message."""
+
+    def __init__(self, refuse=0):
+        self.refuse = refuse  # times each message's DATA is refused with a 451 first
+        self.attempts = {}
+        self.delivered = []
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        with self.lock:
+            self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        subject = envelope.content.decode().split("Subject: ", 1)[1].split("\n", 1)[0].strip()
+        with self.lock:
+            self.attempts[subject] = self.attempts.get(subject, 0) + 1
+            if self.attempts[subject] <= self.refuse:
+                return "451 Try again later"
+            self.delivered.append((envelope.mail_from, envelope.content.decode(), subject))
+        return "250 OK"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    # Only the tests that talk to a server need aiosmtpd (requirements-dev.txt)
+    controller_module = pytest.importorskip("aiosmtpd.controller")
+    servers = []
+
+    def start(handler):
+        controller = controller_module.Controller(handler, hostname="127.0.0.1", port=_free_port())
+        controller.start()
+        servers.append(controller)
+        return controller
+
+    yield start
+    for controller in servers:
+        controller.stop()
+
+
+def _message(subject):
+    msg = MIMEText("hello")
+    msg["Subject"] = subject
+    msg["To"] = "user@example.com"
+    return msg
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.02)
+
+
+def test_batch_goes_out_over_one_connection_from_the_sender(smtp_server):
+    handler = Recorder()
+    controller = smtp_server(handler)
+    worker = MailWorker(controller.hostname, controller.port, sender=SENDER, starttls=False, batch_size=3)
+    for i in range(7):
+        assert worker.enqueue(_message(f"message {i}"))
+
+    _wait_for(lambda: len(handler.delivered) == 7)
+    assert handler.connections == 1
+    assert sorted(subject for _, _, subject in handler.delivered) == [f"message {i}" for i in range(7)]
+    for mail_from, content, _ in handler.delivered:
+        assert mail_from == SENDER
+        assert f"From: {SENDER}" in content
+
+
+def test_batches_are_at_most_batch_size():
+    worker = MailWorker("localhost", 25, sender=SENDER, batch_size=3)
+    worker._queue = queue.Queue()
+    for i in range(5):
+        worker._queue.put((1, _message(f"message {i}")))
+    assert len(worker._next_batch()) == 3
+    assert len(worker._next_batch()) == 2
+
+
+def test_refused_mail_is_retried_with_backoff(smtp_server):
+    handler = Recorder(refuse=2)
+    controller = smtp_server(handler)
+    worker = MailWorker(controller.hostname, controller.port, sender=SENDER, starttls=False, backoff=0.05)
+    worker.enqueue(_message("retried"))
+
+    _wait_for(lambda: handler.delivered)
+    assert handler.attempts == {"retried": 3}
+
+
+def test_gives_up_after_max_attempts(smtp_server, caplog):
+    handler = Recorder(refuse=10)
+    controller = smtp_server(handler)
+    worker = MailWorker(
+        controller.hostname, controller.port, sender=SENDER, starttls=False, backoff=0.02, max_attempts=3)
+    worker.enqueue(_message("doomed"))
+
+    _wait_for(lambda: "Giving up" in caplog.text)
+    assert handler.attempts == {"doomed": 3}
+    assert not handler.delivered
+
+
+def test_sender_falls_back_to_the_login():
+    assert MailWorker("smtp.example.com", 587, user="me@example.com").sender == "me@example.com"
+    assert MailWorker("smtp.example.com", 587, user="me", sender=SENDER).sender == SENDER
+
+
+def test_no_sender_fails_loudly():
+    with pytest.raises(ValueError):
+        MailWorker("smtp.example.com", 587)
+    # Without a server (local development) mail is refused instead of sent from "None"
+    assert MailWorker(None, None).enqueue(_message("nowhere")) is False
+
+
+def test_builders_run_on_the_worker_and_may_send_nothing(smtp_server):
+    handler = Recorder()
+    controller = smtp_server(handler)
+    worker = MailWorker(controller.hostname, controller.port, sender=SENDER, starttls=False)
+    built = []
+    assert worker.enqueue(lambda: built.append("nobody") or None)
+    assert worker.enqueue(lambda: built.append("somebody") or _message("built"))
+
+    _wait_for(lambda: handler.delivered)
+    assert built == ["nobody", "somebody"]
+    assert [(mail_from, subject) for mail_from, _, subject in handler.delivered] == [(SENDER, "built")]
@@ -0,0 +1,26 @@
+import pandas as pd
+
+from utils.weight_import import normalise_weights
+
+
+def test_mixed_date_formats_are_all_kept():
+    df = pd.DataFrame({
+        "Date": ["2024-01-01", "2024-01-03 07:00", "01/05/2024"],
+        "Weight": [80, 79.5, 79],
+    })
+    clean, rejected = normalise_weights(df)
+    assert rejected == 0
+    assert list(clean["created_at"]) == [
+        pd.Timestamp("2024-01-01"), pd.Timestamp("2024-01-03 07:00"), pd.Timestamp("2024-01-05"),
+    ]
+
+
+def test_invalid_rows_are_rejected_and_pounds_converted():
+    df = pd.DataFrame({
+        "date": ["2024-01-01", "not a date", "2024-01-02", "2024-01-03"],
+        "WEIGHT": [176.37, 80, -1, 80],
+        "Unit": ["lbs", "kg", "kg", "stone"],
+    })
+    clean, rejected = normalise_weights(df)
+    assert rejected == 3
+    assert list(clean["weight_kg"]) == [80.0]
@@ -0,0 +1,85 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from utils.weight_trend import WeightTrend
+
+START = date(2024, 1, 1)
+
+
+def _history():
+    """Three weeks of weigh-ins with a few missed days and a day weighed twice."""
+    days, sums, counts = [], [], []
+    for offset in range(21):
+        if offset in (4, 5, 12):
+            continue
+        weight = 85 - 0.1 * offset + (0.4 if offset % 3 else -0.3)
+        entries = 2 if offset == 9 else 1
+        days.append(START + timedelta(days=offset))
+        sums.append(weight * entries)
+        counts.append(entries)
+    return days, sums, counts
+
+
+def _with_weigh_in(day, weight):
+    days, sums, counts = _history()
+    if day in days:
+        i = days.index(day)
+        sums[i] += weight
+        counts[i] += 1
+    else:
+        days.append(day)
+        sums.append(weight)
+        counts.append(1)
+        days, sums, counts = (list(column) for column in zip(*sorted(zip(days, sums, counts))))
+    return WeightTrend.from_daily(days, sums, counts)
+
+
+def assert_same_trend(actual, expected):
+    np.testing.assert_array_equal(actual.days, expected.days)
+    np.testing.assert_allclose(actual.sums, expected.sums)
+    np.testing.assert_array_equal(actual.counts, expected.counts)
+    np.testing.assert_allclose(actual.trend, expected.trend)
+    assert actual.averages.keys() == expected.averages.keys()
+    for window in expected.averages:
+        np.testing.assert_allclose(actual.averages[window], expected.averages[window])
+    np.testing.assert_allclose(actual.rate, expected.rate)  # NaNs compare equal
+    assert actual.columns() == expected.columns()
+
+
+@pytest.mark.parametrize("day", [
+    START + timedelta(days=20),  # another weigh-in on the last day
+    START + timedelta(days=21),  # the next day
+    START + timedelta(days=32),  # after an 11-day gap
+    START + timedelta(days=12),  # backdated onto a missed day
+    START + timedelta(days=9),   # backdated onto a day already weighed
+    START - timedelta(days=3),   # backdated before the first day
+])
+def test_add_matches_a_full_recompute(day):
+    trend = WeightTrend.from_daily(*_history())
+    assert_same_trend(trend.add(day, 83.7), _with_weigh_in(day, 83.7))
+
+
+def test_add_to_an_empty_history():
+    empty = WeightTrend.from_daily([], [], [])
+    assert_same_trend(empty.add(START, 80.0), WeightTrend.from_daily([START], [80.0], [1]))
+
+
+def test_several_adds_in_a_row_match_a_full_recompute():
+    trend = WeightTrend.from_daily(*_history())
+    days, sums, counts = _history()
+    for offset, weight in [(21, 82.9), (21, 83.3), (25, 82.5), (7, 84.0)]:
+        day = START + timedelta(days=offset)
+        trend = trend.add(day, weight)
+        if day in days:
+            sums[days.index(day)] += weight
+            counts[days.index(day)] += 1
+        else:
+            days.append(day)
+            sums.append(weight)
+            counts.append(1)
+    order = np.argsort(np.array(days, dtype="datetime64[D]"))
+    expected = WeightTrend.from_daily(
+        [days[i] for i in order], [sums[i] for i in order], [counts[i] for i in order])
+    assert_same_trend(trend, expected)
@@ -0,0 +1,124 @@
+from utils.cache import cached
+from utils.database_connection import get_db_connection
+
+# Buckets accepted by date_trunc for the history charts
+RESOLUTIONS = ("day", "week", "month")
+
+
+def _check_resolution(resolution):
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unsupported resolution {resolution!r}, expected one of {RESOLUTIONS}")
+
+
+def _window(start, end, column="day"):
+    """Extra WHERE clauses and params limiting ``column`` to [start, end)."""
+    clauses, params = "", []
+    if start is not None:
+        clauses += f" AND {column} >= %s"
+        params.append(start)
+    if end is not None:
+        clauses += f" AND {column} < %s"
+        params.append(end)
+    return clauses, params
+
+
+# The totals below read daily_nutrition_summary (one row per user and day,
+# maintained by save_meal) rather than summing every logged meal
+
+
+@cached("calories_table")
+def get_calorie_totals(username, resolution="day", start=None, end=None):
+    """Calories summed per day/week/month for a user, oldest period first.
+
+    ``start``/``end`` optionally limit the rows to a zoomed chart window.
+    """
+    _check_resolution(resolution)
+    window, window_params = _window(start, end)
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT date_trunc(%s, day)::date AS period, SUM(kcal)
+                FROM daily_nutrition_summary
+                WHERE username = %s AND calorie_entries > 0{window}
+                GROUP BY period
+                ORDER BY period
+                """,
+                [resolution, username] + window_params
+            )
+            rows = cur.fetchall()
+    return [{"Date": row[0], "Calories": float(row[1])} for row in rows]
+
+
+@cached("macros_table")
+def get_macro_totals(username, resolution="day", start=None, end=None):
+    """Protein, carbs and fat summed per day/week/month for a user, oldest period first.
+
+    ``start``/``end`` optionally limit the rows to a zoomed chart window.
+    """
+    _check_resolution(resolution)
+    window, window_params = _window(start, end)
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT date_trunc(%s, day)::date AS period, SUM(protein), SUM(carbs), SUM(fat)
+                FROM daily_nutrition_summary
+                WHERE username = %s AND macro_entries > 0{window}
+                GROUP BY period
+                ORDER BY period
+                """,
+                [resolution, username] + window_params
+            )
+            rows = cur.fetchall()
+    return [
+        {"Date": row[0], "Protein": float(row[1]), "Carbs": float(row[2]), "Fat": float(row[3])}
+        for row in rows
+    ]
+
+
+@cached("bodyweight")
+def get_weight_averages(username, resolution="day", start=None, end=None):
+    """Average weight (kg) per day/week/month for a user, oldest period first."""
+    _check_resolution(resolution)
+    window, window_params = _window(start, end, column="created_at")
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT date_trunc(%s, created_at)::date AS period, AVG(weight_kg)
+                FROM bodyweight
+                WHERE username = %s{window}
+                GROUP BY period
+                ORDER BY period
+                """,
+                [resolution, username] + window_params
+            )
+            rows = cur.fetchall()
+    return [{"Date": row[0], "Weight": float(row[1])} for row in rows]
+
+
+def get_calorie_tail(username, day):
+    """Daily totals for ``day`` and for the last logged day before it.
+
+    This is the part of the daily chart a new meal can change: the point for its
+    day and the point that day's line segment joins. Both are single rows of the
+    daily summary, so the cost doesn't grow with history length.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT day, kcal FROM daily_nutrition_summary
+                WHERE username = %(user)s AND calorie_entries > 0 AND (
+                    day = %(day)s OR day = (
+                        SELECT MAX(day) FROM daily_nutrition_summary
+                        WHERE username = %(user)s AND calorie_entries > 0 AND day < %(day)s
+                    )
+                )
+                ORDER BY day
+                """,
+                {"user": username, "day": day}
+            )
+            rows = cur.fetchall()
+    return [{"Date": row[0], "Calories": float(row[1])} for row in rows]
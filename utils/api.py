@@ -0,0 +1,108 @@
+"""Read-only JSON API over a user's history, for clients other than the Dash pages.
+
+    GET /api/v1/series?metric=calories|protein|carbs|fat|weight
+                      &resolution=day|week|month&from=YYYY-MM-DD&to=YYYY-MM-DD
+
+answers with one column of period start dates and one of values, summed (or
+averaged, for weight) on the server. ``from`` and ``to`` are both inclusive
+and optional. The ETag is the user's data version (see utils.data_version),
+so a client sending ``If-None-Match`` gets a 304 after a single-row lookup
+while nothing has been logged.
+
+    GET /api/v1/export?data=meals|macros|weight&format=csv|parquet
+
+downloads the user's full history as a file, streamed (see utils.export).
+"""
+import hashlib
+from datetime import date, timedelta
+
+from flask import Blueprint, Response, jsonify, request
+from flask_login import current_user
+
+from utils.aggregates import RESOLUTIONS, get_calorie_totals, get_macro_totals, get_weight_averages
+from utils.data_version import get_version
+from utils.export import EXPORTS, FORMATS, csv_stream, parquet_available, parquet_stream
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+# metric -> (loader, row key, unit)
+METRICS = {
+    "calories": (get_calorie_totals, "Calories", "kcal"),
+    "protein": (get_macro_totals, "Protein", "g"),
+    "carbs": (get_macro_totals, "Carbs", "g"),
+    "fat": (get_macro_totals, "Fat", "g"),
+    "weight": (get_weight_averages, "Weight", "kg"),
+}
+
+def _error(message, status=400):
+    return jsonify({"error": message}), status
+
+
+def _etag(username, version):
+    # Includes the user, so a browser shared between accounts never revalidates
+    # one user's cached response with another's version number
+    return hashlib.sha256(f"{username}:{version}".encode()).hexdigest()[:20]
+
+
+@api.route("/series")
+def series():
+    if not (hasattr(current_user, "is_authenticated") and current_user.is_authenticated):
+        return _error("login required", 401)
+
+    metric = request.args.get("metric", "")
+    resolution = request.args.get("resolution", "day")
+    if metric not in METRICS:
+        return _error(f"metric must be one of {', '.join(METRICS)}")
+    if resolution not in RESOLUTIONS:
+        return _error(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    try:
+        start = date.fromisoformat(request.args["from"]) if request.args.get("from") else None
+        end = date.fromisoformat(request.args["to"]) + timedelta(days=1) if request.args.get("to") else None
+    except ValueError:
+        return _error("from and to must be dates as YYYY-MM-DD")
+
+    version = get_version(current_user.id)
+    if version is None:
+        return _error("unknown user", 404)
+    etag = _etag(current_user.id, version)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        # The loaders check the worker's history cache against the data version
+        # themselves, so totals cached before a write made elsewhere are not sent
+        loader, key, unit = METRICS[metric]
+        rows = loader(current_user.id, resolution, start, end)
+        response = jsonify({
+            "metric": metric,
+            "resolution": resolution,
+            "unit": unit,
+            "dates": [str(row["Date"]) for row in rows],
+            "values": [round(row[key], 2) for row in rows],
+        })
+    response.set_etag(etag)
+    # Per user, and always revalidated so a new entry shows up straight away
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.headers["Vary"] = "Cookie"
+    return response
+
+
+@api.route("/export")
+def export():
+    if not (hasattr(current_user, "is_authenticated") and current_user.is_authenticated):
+        return _error("login required", 401)
+
+    name = request.args.get("data", "")
+    fmt = request.args.get("format", "csv")
+    if name not in EXPORTS:
+        return _error(f"data must be one of {', '.join(EXPORTS)}")
+    if fmt not in FORMATS:
+        return _error(f"format must be one of {', '.join(FORMATS)}")
+    if fmt == "parquet" and not parquet_available():
+        return _error("Parquet export needs pyarrow installed on the server", 501)
+
+    # The generator runs after this returns, while the response is being sent
+    stream = (csv_stream if fmt == "csv" else parquet_stream)(name, current_user.id)
+    response = Response(stream, mimetype=FORMATS[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="{name}.{fmt}"'
+    response.headers["Cache-Control"] = "private, no-store"
+    return response
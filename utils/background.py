@@ -0,0 +1,193 @@
+"""Background work: the shared job manager, a bounded job queue and thread pools.
+
+Bulk weight uploads run as Dash background callbacks in their own processes,
+so gunicorn's request threads only ever do fast work. State lives in a
+diskcache directory shared by every worker.
+
+Jobs run outside the Flask request, so ``current_user`` is not available in
+them. A request callback files the job's inputs with ``submit_job`` under an
+unguessable id, and the background callback picks them up with ``claim_job``.
+
+USDA search is mostly waiting on the network and depends on per-process state
+(the keep-alive session and in-flight coalescing in utils.usda_query, the
+database pool), which a freshly forked job would start without. It runs on a
+small thread pool in the web process instead: ``start_pooled`` returns a job
+id at once, the result lands in the shared cache, and the page polls for it
+with ``pooled_result``, so no request thread waits on the search.
+"""
+import os
+import secrets
+import threading
+import time
+from concurrent import futures
+from contextlib import contextmanager
+
+import diskcache
+import psutil
+from dash import DiskcacheManager
+
+CACHE_DIR = os.getenv(
+    "BACKGROUND_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "background_cache"),
+)
+# Jobs allowed to run at once, and running plus waiting, per kind of job
+MAX_RUNNING = int(os.getenv("BACKGROUND_MAX_RUNNING", "2"))
+MAX_QUEUED = int(os.getenv("BACKGROUND_MAX_QUEUED", "8"))
+JOB_TTL = int(os.getenv("BACKGROUND_JOB_TTL", "600"))
+# Pooled calls one worker admits at once, running or waiting. Kept below the
+# worker's request threads (gunicorn.conf.py) so a burst can never tie them all up.
+POOL_MAX_QUEUED = int(os.getenv(
+    "BACKGROUND_POOL_MAX_QUEUED", str(max(int(os.getenv("GUNICORN_THREADS", "4")) - 1, 1))))
+# Longest a pooled search may take, queueing included, before the page gives up on it
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "20"))
+
+cache = diskcache.Cache(CACHE_DIR)
+manager = DiskcacheManager(cache, expire=JOB_TTL)
+
+
+class QueueFull(Exception):
+    """Raised by ``job_slot`` and ``start_pooled`` when too many of one kind are already queued."""
+
+
+def submit_job(payload):
+    """Store a job's inputs and return the id a background callback claims them by."""
+    job_id = secrets.token_urlsafe(16)
+    cache.set(f"job:{job_id}", payload, expire=JOB_TTL)
+    return job_id
+
+
+def claim_job(job_id):
+    """Take a submitted job's inputs, or None if unknown, expired or already claimed."""
+    if not job_id:
+        return None
+    return cache.pop(f"job:{job_id}", default=None)
+
+
+def _alive(pid):
+    try:
+        return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+
+def _live_jobs(kind):
+    # A cancelled job's process is killed without running its cleanup, so
+    # entries are pruned by checking the process is still there
+    key = f"slots:{kind}"
+    jobs = [pid for pid in cache.get(key, default=[]) if _alive(pid)]
+    cache.set(key, jobs)
+    return jobs
+
+
+@contextmanager
+def job_slot(kind, on_wait=None, poll=0.25):
+    """Hold one of ``MAX_RUNNING`` slots for ``kind`` while the block runs.
+
+    Jobs beyond that wait their turn in arrival order; ``on_wait`` is called
+    once if this one has to. Raises ``QueueFull`` without waiting when
+    ``MAX_QUEUED`` jobs of this kind are already running or waiting.
+    """
+    pid = os.getpid()
+    lock = diskcache.Lock(cache, f"slots-lock:{kind}", expire=10)
+    with lock:
+        jobs = _live_jobs(kind)
+        if len(jobs) >= MAX_QUEUED:
+            raise QueueFull(kind)
+        cache.set(f"slots:{kind}", jobs + [pid])
+
+    try:
+        waiting = False
+        while True:
+            with lock:
+                if pid in _live_jobs(kind)[:MAX_RUNNING]:
+                    break
+            if not waiting and on_wait is not None:
+                on_wait()
+            waiting = True
+            time.sleep(poll)
+        yield
+    finally:
+        with lock:
+            cache.set(f"slots:{kind}", [job for job in _live_jobs(kind) if job != pid])
+
+
+class _Pool:
+    """At most ``MAX_RUNNING`` threads, admitting ``POOL_MAX_QUEUED`` calls at a time."""
+
+    def __init__(self, kind):
+        self.executor = futures.ThreadPoolExecutor(
+            max_workers=min(MAX_RUNNING, POOL_MAX_QUEUED), thread_name_prefix=kind)
+        self.admitted = threading.BoundedSemaphore(POOL_MAX_QUEUED)
+        self.pid = os.getpid()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool(kind):
+    # Threads do not survive a fork, so a worker forked after first use starts its own
+    with _pools_lock:
+        pool = _pools.get(kind)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[kind] = _Pool(kind)
+        return pool
+
+
+def start_pooled(kind, func, *args):
+    """Queue ``func(*args)`` on this process's thread pool for ``kind`` and return a job id.
+
+    Raises ``QueueFull`` when ``POOL_MAX_QUEUED`` calls of this kind are already
+    running or waiting. The outcome is kept in the shared cache for
+    ``pooled_result``, so any worker can answer the poll for it.
+    """
+    pool = _pool(kind)
+    if not pool.admitted.acquire(blocking=False):
+        raise QueueFull(kind)
+    job_id = secrets.token_urlsafe(16)
+    cache.set(f"pooled:{job_id}", {"state": "queued", "started": time.time()}, expire=JOB_TTL)
+    try:
+        future = pool.executor.submit(_run_pooled, job_id, func, args)
+    except BaseException:
+        pool.admitted.release()
+        raise
+    future.add_done_callback(lambda _: pool.admitted.release())
+    return job_id
+
+
+def _run_pooled(job_id, func, args):
+    key = f"pooled:{job_id}"
+    with cache.transact():
+        job = cache.get(key)
+        if job is None or job["state"] != "queued":
+            return  # cancelled (or expired) while it waited
+        cache.set(key, dict(job, state="running"), expire=JOB_TTL)
+    try:
+        outcome = {"state": "done", "result": func(*args)}
+    except Exception as e:
+        outcome = {"state": "error", "error": e}
+    # A cancel while running wins; its result is simply dropped
+    with cache.transact():
+        if cache.get(key, default={}).get("state") == "running":
+            try:
+                cache.set(key, dict(job, **outcome), expire=JOB_TTL)
+            except Exception as e:  # e.g. an exception that can't be pickled
+                cache.set(key, dict(job, state="error", error=RuntimeError(repr(e))), expire=JOB_TTL)
+
+
+def pooled_result(job_id):
+    """A pooled job as ``{"state": "queued" | "running" | "done" | "error" | "cancelled", ...}``.
+
+    ``"started"`` is when it was queued (epoch seconds), ``"result"`` its return
+    value once done and ``"error"`` the exception it raised. None for an unknown
+    or expired id.
+    """
+    if not job_id:
+        return None
+    return cache.get(f"pooled:{job_id}")
+
+
+def cancel_pooled(job_id):
+    """Mark a pooled job cancelled: it is skipped if still waiting, its result dropped otherwise."""
+    if job_id:
+        cache.set(f"pooled:{job_id}", {"state": "cancelled"}, expire=JOB_TTL)
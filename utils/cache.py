@@ -0,0 +1,227 @@
+"""In-process cache for per-user history reads.
+
+Entries are keyed by ``(username, namespace, args)`` where the namespace is the
+table the read comes from. The cache is per process, so each worker also keeps
+the user's data version (see utils.data_version) its entries were read at.
+``sync_history_cache`` compares it with the database before every read and
+drops the user's entries when a write, made by any worker, has moved it on.
+Writes made here report the version they produced with
+:meth:`UserCache.written`, which keeps the rest of the user's entries when
+nothing else was written in between.
+"""
+import functools
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+# Namespace of the entry holding the data version a user's entries were read at
+VERSION = "data_version"
+
+
+class UserCache:
+    """LRU cache with a TTL, an entry limit and an approximate memory cap."""
+
+    def __init__(self, max_entries=1024, ttl=60, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._keys_by_user = defaultdict(set)
+        # Bumped on every invalidation so a load that raced a write is not stored
+        self._generations = defaultdict(int)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _version(self, username):
+        entry = self._entries.get((username, VERSION, ()))
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[2]
+
+    def _set_version(self, username, version):
+        key = (username, VERSION, ())
+        self._insert(key, len(pickle.dumps(version, protocol=pickle.HIGHEST_PROTOCOL)), version)
+
+    def sync(self, username, version):
+        """Drop ``username``'s entries unless they were read at data ``version``.
+
+        The version is kept as an entry itself, so it is bounded and evicted
+        like the reads it vouches for. Once it is gone nothing says which
+        version the remaining reads are from, so they are dropped too.
+        """
+        with self._lock:
+            if version is not None and self._version(username) == version:
+                self._entries.move_to_end((username, VERSION, ()))
+                return
+            self._drop(username)
+            if version is not None:
+                self._set_version(username, version)
+
+    def written(self, username, version, *namespaces):
+        """Account for a write this worker committed, which took ``username`` to ``version``.
+
+        Drops ``namespaces`` (every entry of the user's if none are given). The
+        other entries are kept only when they were read at the version just
+        before, i.e. no other write came in between. Returns the generation to
+        pass to :meth:`update` to fold the write into a kept entry, or None
+        when nothing from before the write was kept.
+        """
+        with self._lock:
+            current = self._version(username)
+            for namespace in namespaces or (None,):
+                self._drop(username, namespace)
+            if version is None:
+                self._drop(username)
+                return None
+            if current == version:
+                # Another thread already synced past the write: what is left was read after it
+                return None
+            if current != version - 1:
+                self._drop(username)
+            self._set_version(username, version)
+            return self._generations[username] if current == version - 1 else None
+
+    def get_or_load(self, username, namespace, args, loader):
+        key = (username, namespace, args)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            generation = self._generations[username]
+
+        value = loader()
+        self._put(key, value, generation)
+        return value
+
+    def update(self, username, namespace, args, func, generation):
+        """Replace a fresh cached value with ``func(value)``; False if none is cached.
+
+        For writes that can fold themselves into a cached result instead of
+        invalidating it, with the ``generation`` :meth:`written` returned for
+        the write. Nothing is changed if the user's entries were dropped since.
+        The entry keeps its original expiry.
+        """
+        key = (username, namespace, args)
+        with self._lock:
+            entry = self._entries.get(key)
+            if generation is None or self._generations[username] != generation:
+                return False
+            if entry is None or entry[0] <= time.monotonic():
+                return False
+            value = func(entry[2])
+            size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+            self._bytes += size - entry[1]
+            self._entries[key] = (entry[0], size, value)
+        return True
+
+    def _put(self, key, value, generation):
+        size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if self._generations[key[0]] != generation:
+                return
+            self._insert(key, size, value)
+
+    def _insert(self, key, size, value):
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, size, value)
+        self._keys_by_user[key[0]].add(key)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[1]
+        user_keys = self._keys_by_user[key[0]]
+        user_keys.discard(key)
+        if not user_keys:
+            del self._keys_by_user[key[0]]
+
+    def invalidate(self, username, namespace=None):
+        """Drop a user's entries for one namespace (or all of them)."""
+        with self._lock:
+            self._drop(username, namespace)
+
+    def _drop(self, username, namespace=None):
+        self._generations[username] += 1
+        for key in list(self._keys_by_user.get(username, ())):
+            if namespace is None or key[1] == namespace:
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+history_cache = UserCache(
+    max_entries=int(os.getenv("HISTORY_CACHE_MAX_ENTRIES", "1024")),
+    ttl=float(os.getenv("HISTORY_CACHE_TTL", "60")),
+    max_bytes=int(os.getenv("HISTORY_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+)
+
+
+def sync_history_cache(username):
+    """Make this worker's cached reads for ``username`` safe to serve; returns the data version.
+
+    Run before reading through the cache: a write made by another worker only
+    shows up here as a new version (see UserCache.sync).
+    """
+    from utils.data_version import get_version  # needs the database, which this module does not
+    version = get_version(username)
+    history_cache.sync(username, version)
+    return version
+
+
+def cached(namespace):
+    """Cache ``func(username, ...)`` in :data:`history_cache` under ``namespace``.
+
+    ``func.update(username, change, *args, generation=..., **kwargs)`` applies
+    ``change`` to the cached result for those arguments, if there is one (see
+    UserCache.update).
+    """
+    def decorator(func):
+        def key(args, kwargs):
+            return (func.__qualname__, args, tuple(sorted(kwargs.items())))
+
+        @functools.wraps(func)
+        def wrapper(username, *args, **kwargs):
+            sync_history_cache(username)
+            return history_cache.get_or_load(
+                username, namespace, key(args, kwargs), lambda: func(username, *args, **kwargs))
+
+        def update(username, change, *args, generation, **kwargs):
+            return history_cache.update(username, namespace, key(args, kwargs), change, generation)
+
+        wrapper.update = update
+        return wrapper
+    return decorator
@@ -0,0 +1,68 @@
+"""BMI, BMR and one-rep-max formulas for the calculator pages.
+
+The pages run these in the browser as clientside callbacks, from
+assets/calculators.js. This module is the reference the JavaScript is checked
+against (tests/test_calculators.py runs both through the same inputs), so a
+change to a formula goes in both places.
+"""
+
+
+def calculate_bmi(unit, height_cm, weight_kg, height_ft, height_in, weight_lb):
+    if unit == "metric":
+        if not height_cm or not weight_kg:
+            return "Please enter both height and weight."
+        bmi = weight_kg / ((height_cm / 100) ** 2)
+    else:
+        if not height_ft or height_in is None or not weight_lb:
+            return "Please enter weight, feet, and inches."
+        total_inches = height_ft * 12 + height_in
+        bmi = 703 * weight_lb / (total_inches ** 2)
+
+    # WHO bands: under 18.5, 18.5-25, 25-30, 30 and over. Each band starts
+    # where the last one ends, so a BMI such as 24.95 is never left unclassified.
+    if bmi < 18.5:
+        category = "Underweight"
+    elif bmi < 25:
+        category = "Normal weight"
+    elif bmi < 30:
+        category = "Overweight"
+    else:
+        category = "Obesity"
+
+    return f"Your BMI is {bmi:.2f} ({category})"
+
+
+def calculate_bmr(units, gender, age, h_cm, h_ft, h_in, w_kg, w_lb, activity):
+    """Mifflin-St Jeor BMR, scaled by the activity multiplier for TDEE."""
+    if not age or (units=="metric" and (not h_cm or not w_kg)) or (units=="imperial" and (not h_ft and not h_in or not w_lb)):
+        return "⚠️ Please fill in all fields."
+
+    # Convert height to cm if imperial; either feet or inches may be left empty
+    if units == "imperial":
+        h_cm = ((h_ft or 0)*12 + (h_in or 0)) * 2.54
+
+    # Convert weight to kg if imperial
+    weight = w_kg if units=="metric" else w_lb * 0.453592
+
+    if gender == "male":
+        bmr = 10 * weight + 6.25 * h_cm - 5 * age + 5
+    else:
+        bmr = 10 * weight + 6.25 * h_cm - 5 * age - 161
+
+    tdee = bmr * float(activity)
+
+    return f"Your BMR is {bmr:.0f} kcal/day • Estimated TDEE: {tdee:.0f} kcal/day"
+
+
+def calculate_1rm(exercise, units, weight, reps):
+    if not weight or not reps:
+        return "⚠️ Please enter both weight and reps."
+
+    # Epley formula
+    one_rm = weight * (1 + reps / 30)
+
+    unit_label = "kg" if units == "metric" else "lbs"
+
+    exercise_name = {"bench": "Bench Press", "squat": "Squat", "deadlift": "Deadlift"}[exercise]
+
+    return f"{exercise_name} estimated 1RM: {one_rm:.1f} {unit_label}"
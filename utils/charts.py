@@ -0,0 +1,92 @@
+"""Shared builder for the history line charts (calories, macros, weight).
+
+History traces are WebGL (``Scattergl``) on a real date axis. Their x values
+are milliseconds since the epoch and their y values floats, both as NumPy
+arrays, which plotly serialises as base64 typed arrays instead of JSON lists of
+strings. The short "today" tail traces and the one-point-per-day overlays
+(the weight trend lines) stay plain lists because the pages append to them
+with ``dash.Patch``.
+
+Every page imports this module at start-up, so NumPy and plotly are only
+imported once a chart is actually built.
+"""
+
+LINE_COLOR = "#1f77b4"
+MACRO_COLORS = {"Protein": "#636efa", "Carbs": "#ef553b", "Fat": "#00cc96"}
+
+
+def epoch_ms(dates):
+    """Dates, datetimes, ISO strings or a datetime64 array as float milliseconds since the epoch."""
+    import numpy as np
+    if isinstance(dates, np.ndarray) and dates.dtype.kind == "M":
+        return dates.astype("datetime64[ms]").astype(np.float64)
+    return np.array([str(d) for d in dates], dtype="datetime64[ms]").astype(np.float64)
+
+
+def series_xy(rows, key):
+    """Typed x (epoch ms) and y arrays for one column of ``rows``.
+
+    ``rows`` is a list of dicts, or columns: a dict of arrays with a datetime64
+    ``"Date"`` array (see utils.database_connection.fetch_columns).
+    """
+    import numpy as np
+    if isinstance(rows, dict):
+        return epoch_ms(rows["Date"]), np.asarray(rows[key], dtype=np.float64)
+    x = epoch_ms([row["Date"] for row in rows])
+    y = np.fromiter((row[key] for row in rows), dtype=np.float64, count=len(rows))
+    return x, y
+
+
+def _line(x, y, name, color, **kwargs):
+    import plotly.graph_objects as go
+    return go.Scattergl(
+        x=x, y=y, name=name,
+        mode="lines+markers",
+        line=dict(width=3, color=color),
+        marker=dict(size=6, color=color),
+        **kwargs
+    )
+
+
+def overlay_line(x, y, name, color, dash="solid"):
+    """Thin list-backed line drawn over the history, e.g. a smoothed trend."""
+    import plotly.graph_objects as go
+    return go.Scattergl(x=x, y=y, name=name, mode="lines", line=dict(width=2, color=color, dash=dash))
+
+
+def build_history_figure(history, series, yaxis_title, tail=None, title=None, overlays=(), uirevision=None):
+    """Line chart with one history trace per ``(key, name, color)`` in ``series``.
+
+    ``history`` is rows or columns, as taken by ``series_xy``. When ``tail``
+    rows are given, a matching list-backed trace per series is added after the
+    history traces, so ``data[len(series) + i]`` is the tail of series ``i``.
+    ``overlays`` (see ``overlay_line``) come last.
+
+    Each page passes its own constant ``uirevision``, so a redraw or the zoom
+    refetch's Patch keeps the range the user zoomed to.
+    """
+    traces = []
+    for key, name, color in series:
+        x, y = series_xy(history, key)
+        traces.append(_line(x, y, name, color))
+    if tail is not None:
+        for key, name, color in series:
+            traces.append(_line(
+                [str(row["Date"]) for row in tail], [row[key] for row in tail],
+                name, color, showlegend=False,
+            ))
+    traces.extend(overlays)
+
+    import plotly.graph_objects as go
+    fig = go.Figure(traces)
+    fig.update_layout(
+        title=title,
+        xaxis_type="date",
+        xaxis_title="Date",
+        yaxis_title=yaxis_title,
+        margin=dict(l=20, r=20, t=30 if title is None else 50, b=20),
+        template="simple_white",
+        showlegend=len(series) > 1 or bool(overlays),
+        uirevision=uirevision,
+    )
+    return fig
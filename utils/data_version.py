@@ -0,0 +1,30 @@
+"""Per-user data version, the ETag behind the JSON API.
+
+Every write to a user's meals, macros or weigh-ins calls ``bump`` on its own
+cursor, so the version changes in the same transaction as the data. The
+workers' history caches (utils.cache) check it too, before serving a read.
+"""
+from utils.database_connection import get_db_connection
+
+
+def bump(cur, username=None):
+    """Mark ``username``'s data (or everyone's) as changed, on the caller's cursor.
+
+    Returns the user's new version, or None when bumping everyone's.
+    """
+    if username is None:
+        cur.execute("UPDATE users SET data_version = data_version + 1")
+        return None
+    cur.execute(
+        "UPDATE users SET data_version = data_version + 1 WHERE username = %s RETURNING data_version", (username,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def get_version(username):
+    """The user's current data version, or None for an unknown user."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT data_version FROM users WHERE username = %s", (username,))
+            row = cur.fetchone()
+    return row[0] if row else None
@@ -1,110 +1,357 @@
-import sqlite3
+import functools
+import io
 import os
+import threading
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 import psycopg2
 from psycopg2 import IntegrityError
+from psycopg2.extensions import cursor as _cursor
+from psycopg2.pool import PoolError
 import secrets
 
 import bcrypt
 
+from utils.metrics import observe_query
+
 load_dotenv()
 
 
+class ConnectionPool:
+    """Process-wide pool of reusable psycopg2 connections.
+
+    Connections are opened lazily up to ``maxconn`` and kept open when they are
+    returned, so a callback only pays for the TCP/auth handshake the first time a
+    slot is used. When every slot is checked out, ``getconn`` waits up to
+    ``timeout`` seconds for one to be returned before raising ``PoolError``.
+    """
+
+    def __init__(self, minconn, maxconn, timeout, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._connect_kwargs = connect_kwargs
+        self._idle = []
+        self._opened = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+        for _ in range(minconn):
+            self._idle.append(self._connect())
+            self._opened += 1
+
+    def _connect(self):
+        return psycopg2.connect(**self._connect_kwargs)
+
+    def getconn(self):
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        with self._cond:
+            self._waiting += 1
+            try:
+                while not self._idle and self._opened >= self.maxconn:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolError(
+                            f"timed out after {self.timeout}s waiting for a database connection"
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._opened += 1
+            self._in_use += 1
+            waited = time.perf_counter() - start
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        try:
+            if conn is None or conn.closed:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._opened -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn, close=False):
+        if not close and not conn.closed:
+            if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+        if close and not conn.closed:
+            conn.close()
+
+        with self._cond:
+            self._in_use -= 1
+            if conn.closed:
+                self._opened -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            for conn in self._idle:
+                conn.close()
+            self._opened -= len(self._idle)
+            self._idle = []
+
+    def stats(self):
+        with self._cond:
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "open": self._opened,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "wait_seconds_total": self._wait_total,
+                "wait_seconds_max": self._wait_max,
+            }
+
+
+class TimedCursor(_cursor):
+    """Cursor that reports every statement's duration to utils.metrics."""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            observe_query(query, time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            observe_query(query, time.perf_counter() - start)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            observe_query(sql, time.perf_counter() - start)
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def connection_params():
+    """psycopg2.connect() keyword arguments from the environment."""
+    return {
+        "database": os.getenv("DATABASE"),
+        "user": os.getenv("DATABASE_USER"),
+        "host": os.getenv("DATABASE_HOST"),
+        "password": os.getenv("DATABASE_PASSWORD"),
+        "port": os.getenv("DATABASE_PORT"),
+    }
+
+
+def get_pool():
+    """Return the pool for this process, creating it on first use.
+
+    The pool is keyed on the pid so a forked worker never reuses sockets it
+    inherited from its parent.
+    """
+    global _pool, _pool_pid
+    if _pool is not None and _pool_pid == os.getpid():
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ConnectionPool(
+                minconn=int(os.getenv("DB_POOL_MIN", "1")),
+                maxconn=int(os.getenv("DB_POOL_MAX", "10")),
+                timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+                cursor_factory=TimedCursor,
+                **connection_params(),
+            )
+            _pool_pid = os.getpid()
+    return _pool
+
+
+def pool_stats():
+    """Snapshot of the connection pool counters (empty before first use)."""
+    if _pool is None or _pool_pid != os.getpid():
+        return {}
+    return _pool.stats()
+
+
+@contextmanager
 def get_db_connection():
-    database = os.getenv("DATABASE")
-    database_user = os.getenv("DATABASE_USER")
-    database_host = os.getenv("DATABASE_HOST")
-    database_password = os.getenv("DATABASE_PASSWORD")
-    database_port = os.getenv("DATABASE_PORT")
+    """Check a connection out of the pool for the duration of a ``with`` block.
+
+    The transaction is committed when the block exits normally and rolled back if
+    it raises; either way the connection goes back to the pool.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        raise
+    finally:
+        pool.putconn(conn, close=broken)
+
 
-    conn = psycopg2.connect(database = database, 
-                        user = database_user, 
-                        host= database_host,
-                        password = database_password,
-                        port = database_port)
+# How each fetch_columns dtype is sent: always 8 bytes wide, so every row of the
+# binary COPY has the same size and the whole result maps onto one NumPy dtype
+COLUMN_CASTS = {
+    "datetime64[ms]": ("(extract(epoch FROM {}) * 1000)::int8", ">i8"),
+    "float64": ("{}::float8", ">f8"),
+    "int64": ("{}::int8", ">i8"),
+}
 
-    return conn
+
+def fetch_columns(query, params, columns):
+    """Run ``query`` and return its result as one NumPy array per column.
+
+    ``columns`` lists ``(name, dtype)`` for the query's result columns, with
+    dtype one of COLUMN_CASTS. The rows are read with a binary ``COPY`` and
+    decoded by NumPy in one go, so no Python object is made per row or value.
+    Columns must not contain NULLs. Rows come back sorted by the first column
+    (the date, for every caller): the ``COPY`` orders by it again, since
+    Postgres does not promise to keep a subquery's ``ORDER BY``. It orders by
+    the subquery's column rather than the converted one, so the planner can see
+    the rows are already sorted and skip a second sort.
+    """
+    import numpy as np
+
+    select = ", ".join(COLUMN_CASTS[dtype][0].format(f'q."{name}"') for name, dtype in columns)
+    buffer = io.BytesIO()
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            inner = cur.mogrify(query, params).decode()
+            cur.copy_expert(
+                f'COPY (SELECT {select} FROM ({inner}) q ORDER BY q."{columns[0][0]}") TO STDOUT WITH (FORMAT binary)',
+                buffer,
+            )
+
+    # Header: 11-byte signature, int32 flags, int32 extension length, extension.
+    # Each row: int16 field count, then an int32 length and the value per field.
+    # Trailer: int16 -1.
+    data = buffer.getbuffer()
+    start = 19 + int.from_bytes(data[15:19], "big")
+    row = np.dtype([("fields", ">i2")] + [
+        field for i, (_, dtype) in enumerate(columns)
+        for field in ((f"len{i}", ">i4"), (f"val{i}", COLUMN_CASTS[dtype][1]))
+    ])
+    body = data[start:len(data) - 2]
+    if len(body) % row.itemsize:
+        raise ValueError("fetch_columns() got NULLs or rows of an unexpected width")
+    rows = np.frombuffer(body, dtype=row)
+    result = {}
+    for i, (name, dtype) in enumerate(columns):
+        if (rows[f"len{i}"] != 8).any():
+            raise ValueError(f"fetch_columns() got NULLs in column {name!r}")
+        values = rows[f"val{i}"].astype(np.int64 if dtype == "datetime64[ms]" else dtype)
+        result[name] = values.view("datetime64[ms]") if dtype == "datetime64[ms]" else values
+    return result
 
 def save_user_to_db(email, username, password):
     # ✅ Hash the password with bcrypt
     hashed_pw = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
     try:
-        cursor.execute(
-            "INSERT INTO users (email, username, password) VALUES (%s, %s, %s)",
-            (email, username, hashed_pw),
-        )
-        conn.commit()
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO users (email, username, password) VALUES (%s, %s, %s)",
+                    (email, username, hashed_pw),
+                )
         return True, "✅ Registration successful!"
 
     except IntegrityError as e:
-        conn.rollback()
         if "unique" in str(e).lower():
             return False, "⚠️ Email or username already exists."
         return False, f"❌ Integrity error: {e}"
 
     except Exception as e:
-        conn.rollback()
         return False, f"❌ Database error: {e}"
 
-    finally:
-        cursor.close()
-        conn.close()
-
 
 def get_user_by_username(username):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE username = %s", (username,))
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
-    return user
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT * FROM users WHERE username = %s", (username,))
+            return cur.fetchone()
+
+@functools.lru_cache(maxsize=1)
+def _dummy_hash():
+    # Checked against when the username is unknown, so a miss costs the same
+    # bcrypt work as a hit and response time doesn't reveal which usernames exist
+    return bcrypt.hashpw(secrets.token_bytes(16), bcrypt.gensalt())
 
 def check_login(username, password):
-    user = get_user_by_username(username)
-    if user and bcrypt.checkpw(password.encode("utf-8"), user["password"].encode("utf-8")):
-        return user
+    """Return the username if the password is correct, otherwise None.
+
+    One indexed lookup and exactly one bcrypt verification per attempt; the
+    connection is always returned to the pool.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT password FROM users WHERE username = %s", (username,))
+            row = cur.fetchone()
+
+    hashed = row[0].encode("utf-8") if row else _dummy_hash()
+    if bcrypt.checkpw(password.encode("utf-8"), hashed) and row:
+        return username
     return None
 
 def update_password(user_id, new_password):
-    conn = get_db_connection()
-    cur = conn.cursor()
     hashed = bcrypt.hashpw(new_password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-    cur.execute("UPDATE users SET password = %s WHERE username = %s", (hashed, user_id))
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("UPDATE users SET password = %s WHERE username = %s", (hashed, user_id))
 
 # --- Reset Token Flow ---
 def create_reset_token(user_id, expires_minutes=30):
     token = secrets.token_urlsafe(32)
     expires_at = datetime.utcnow() + timedelta(minutes=expires_minutes)
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO password_resets (user_id, token, expires_at) VALUES (%s, %s, %s)",
-        (user_id, token, expires_at)
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO password_resets (user_id, token, expires_at) VALUES (%s, %s, %s)",
+                (user_id, token, expires_at)
+            )
 
     return token
 
 def verify_token(token):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT user_id FROM password_resets WHERE token = %s AND expires_at > %s",
-        (token, datetime.utcnow())
-    )
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
-    return row[0] if row else None
\ No newline at end of file
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT user_id FROM password_resets WHERE token = %s AND expires_at > %s",
+                (token, datetime.utcnow())
+            )
+            row = cur.fetchone()
+    return row[0] if row else None
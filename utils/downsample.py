@@ -0,0 +1,137 @@
+"""Downsampling for the long time-series charts.
+
+Plotly draws every point it is sent, so a multi-year history from a scale that
+logs several times a day gets slow to render and pan. The charts send at most
+about one point per horizontal pixel, picked with Largest-Triangle-Three-Buckets
+so peaks and dips survive. Zooming in asks for the visible window again at full
+resolution (see ``zoom_patch``).
+"""
+from datetime import datetime, timedelta
+
+from dash import Patch
+
+from utils.charts import series_xy
+
+# Used until the browser has reported the chart's real width
+DEFAULT_WIDTH = 800
+MIN_POINTS = 50
+
+
+def lttb(x, y, threshold):
+    """Indices of the ``threshold`` points LTTB keeps from ascending ``x``."""
+    import numpy as np
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    keep = np.empty(threshold, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        # Third vertex is the average of the next bucket (the last point for the last bucket)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def chart_points(width):
+    """Point budget for a chart ``width`` pixels wide."""
+    return max(int(width or DEFAULT_WIDTH), MIN_POINTS)
+
+
+def downsample(rows, width, value_keys):
+    """Thin ``rows`` (dicts with a ``Date`` key, oldest first) for a chart ``width`` px wide.
+
+    With several value columns each one is downsampled on its own and the union
+    of the kept rows is returned, so every line keeps its shape.
+    """
+    threshold = chart_points(width)
+    if len(rows) <= threshold:
+        return rows
+    import numpy as np  # short histories never need it
+
+    x = np.array([str(row["Date"]) for row in rows], dtype="datetime64[s]").astype(np.int64)
+    keep = _keep(x, [[row[key] for row in rows] for key in value_keys], threshold)
+    return [rows[i] for i in keep]
+
+
+def downsample_columns(columns, width, value_keys):
+    """``downsample`` for columnar data: a dict of equal-length NumPy arrays.
+
+    ``columns["Date"]`` is a datetime64 array; every array is thinned alike.
+    """
+    threshold = chart_points(width)
+    if len(columns["Date"]) <= threshold:
+        return columns
+    import numpy as np
+
+    x = columns["Date"].astype("datetime64[s]").astype(np.int64)
+    keep = _keep(x, [columns[key] for key in value_keys], threshold)
+    return {name: values[keep] for name, values in columns.items()}
+
+
+def _keep(x, ys, threshold):
+    # Union of the indices LTTB keeps for each series, sharing the point budget
+    import numpy as np
+    per_series = max(threshold // len(ys), 3)
+    return np.unique(np.concatenate([lttb(x, y, per_series) for y in ys]))
+
+
+def relayout_window(relayout):
+    """Read a graph's ``relayoutData`` as the visible x-axis window.
+
+    Returns ``(start, end)`` datetimes after a zoom, ``"reset"`` when the axis
+    went back to autorange and None for anything else (y-only zoom, resize, ...).
+    """
+    if not relayout:
+        return None
+    if relayout.get("xaxis.autorange"):
+        return "reset"
+    if "xaxis.range[0]" in relayout and "xaxis.range[1]" in relayout:
+        bounds = relayout["xaxis.range[0]"], relayout["xaxis.range[1]"]
+    elif "xaxis.range" in relayout:
+        bounds = relayout["xaxis.range"]
+    else:
+        return None
+    try:
+        start, end = (datetime.fromisoformat(str(bound)) for bound in bounds)
+    except ValueError:
+        return None
+    return start, end
+
+
+def day_window(window):
+    """Widen a zoom window to whole days, as a half-open [first day, day after last) range."""
+    start, end = window
+    return start.date(), end.date() + timedelta(days=1)
+
+
+def zoom_patch(relayout, load, width, value_keys, before=None):
+    """Patch swapping a history chart's traces for the zoomed window, or None if nothing changed.
+
+    After a zoom the traces get the visible whole days at full resolution,
+    after a reset the downsampled overview again. ``load(start, end)`` returns
+    the rows (dicts with a ``Date`` key, oldest first) for [start, end), or all
+    of them when both are None. Trace ``i`` draws ``value_keys[i]``. With
+    ``before``, later rows are left out, for charts whose tail is its own trace.
+    """
+    window = relayout_window(relayout)
+    if window is None:
+        return None
+    rows = load(None, None) if window == "reset" else load(*day_window(window))
+    if before is not None:
+        rows = [row for row in rows if row["Date"] < before]
+    rows = downsample(rows, width, value_keys)
+    fig = Patch()
+    for i, key in enumerate(value_keys):
+        fig["data"][i]["x"], fig["data"][i]["y"] = series_xy(rows, key)
+    return fig
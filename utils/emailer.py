@@ -1,20 +1,182 @@
+import functools
+import heapq
+import itertools
+import logging
+import os
+import queue
 import smtplib
+import threading
+import time
+from email.message import Message
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import os
 
 SMTP_SERVER = os.getenv("SMTP_SERVER")
 SMTP_PORT = os.getenv("SMTP_PORT")
 SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASS = os.getenv("SMTP_PASS")
+# Address mail is sent from; most providers log in with it, so it defaults to the login
+SMTP_FROM = os.getenv("SMTP_FROM") or SMTP_USER
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() != "false"
+
+logger = logging.getLogger(__name__)
+
+
+class MailWorker:
+    """Background sender that keeps one authenticated SMTP connection open.
+
+    ``enqueue`` returns immediately; a daemon thread drains the queue in batches
+    over the same connection, reconnecting when the server drops it and retrying
+    failed messages with exponential backoff. The connection is closed after
+    ``idle_timeout`` seconds without mail. Every message goes out from
+    ``sender`` (the login ``user`` when not given), in both the From header and
+    the envelope; with a ``host`` but neither, the constructor raises
+    ValueError, so a misconfigured deployment fails at start-up.
+    """
+
+    def __init__(self, host, port, user=None, password=None, sender=None, starttls=True, timeout=10,
+                 batch_size=20, max_attempts=5, backoff=2.0, idle_timeout=60, max_queue=1000):
+        self.host = host
+        self.port = int(port) if port else 0
+        self.user = user
+        self.password = password
+        self.sender = sender or user
+        if host and not self.sender:
+            raise ValueError("SMTP_SERVER is set but there is no sender address: set SMTP_FROM or SMTP_USER")
+        self.starttls = starttls
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._smtp = None
+        self._retries = []  # heap of (due, seq, attempt, msg); worker thread only
+        self._seq = itertools.count()
+
+    def enqueue(self, msg):
+        """Queue a message for delivery. Returns False if the queue is full or mail isn't set up.
+
+        ``msg`` may also be a function that builds the message on the worker
+        thread, for mail that needs database work first. It returns None when
+        there is nothing to send.
+        """
+        to = msg["To"] if isinstance(msg, Message) else "a message built on send"
+        if not self.sender:
+            logger.error("Mail is not configured (no SMTP_FROM or SMTP_USER), dropping %s", to)
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((1, msg))
+            return True
+        except queue.Full:
+            logger.error("Mail queue full, dropping %s", to)
+            return False
+
+    def _ensure_started(self):
+        with self._lock:
+            # Started lazily and per process, so a preforking server never inherits a dead thread
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._smtp = None
+            self._retries = []
+            self._thread = threading.Thread(target=self._run, name="mail-worker", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch and not self._retries:
+                self._close()
+            for attempt, msg in batch:
+                self._deliver(attempt, msg)
+
+    def _next_batch(self):
+        now = time.monotonic()
+        batch = []
+        while self._retries and self._retries[0][0] <= now and len(batch) < self.batch_size:
+            _, _, attempt, msg = heapq.heappop(self._retries)
+            batch.append((attempt, msg))
+
+        if not batch:
+            wait = self.idle_timeout
+            if self._retries:
+                wait = min(wait, self._retries[0][0] - now)
+            try:
+                batch.append(self._queue.get(timeout=max(wait, 0)))
+            except queue.Empty:
+                return batch
 
-def send_reset_email(to_email, token):
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            smtp.starttls()
+        if self.user:
+            smtp.login(self.user, self.password)
+        return smtp
+
+    def _close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+    def _deliver(self, attempt, msg):
+        if not isinstance(msg, Message):
+            # Built once; a retry resends the same message rather than building another
+            try:
+                msg = msg()
+            except Exception:
+                logger.exception("Could not build queued mail, dropping it")
+                return
+            if msg is None:
+                return
+        del msg["From"]
+        msg["From"] = self.sender
+        try:
+            if self._smtp is None:
+                self._smtp = self._connect()
+            try:
+                self._smtp.send_message(msg, from_addr=self.sender)
+            except smtplib.SMTPServerDisconnected:
+                # Server closed the idle connection; reconnect once and resend
+                self._smtp = self._connect()
+                self._smtp.send_message(msg, from_addr=self.sender)
+        except (smtplib.SMTPException, OSError) as e:
+            self._close()
+            if attempt >= self.max_attempts:
+                logger.error("Giving up on mail to %s after %d attempts: %s", msg["To"], attempt, e)
+                return
+            delay = self.backoff * 2 ** (attempt - 1)
+            heapq.heappush(self._retries, (time.monotonic() + delay, next(self._seq), attempt + 1, msg))
+        except Exception:
+            logger.exception("Dropping undeliverable mail to %s", msg["To"])
+
+
+mailer = MailWorker(SMTP_SERVER, SMTP_PORT, SMTP_USER, SMTP_PASS, sender=SMTP_FROM, starttls=SMTP_STARTTLS)
+
+
+def build_reset_email(to_email, token):
     reset_link = f"https://fitnessdashboard.onrender.com/reset-password/{token}"
 
     msg = MIMEMultipart("alternative")
     msg["Subject"] = "Password Reset Request"
-    msg["From"] = SMTP_USER
-    msg["To"] = to_email
+    msg["To"] = to_email  # From is set by the mail worker
 
     html = f"""
     <html>
@@ -29,8 +191,26 @@ def send_reset_email(to_email, token):
     """
 
     msg.attach(MIMEText(html, "html"))
+    return msg
 
-    with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-        server.starttls()
-        server.login(SMTP_USER, SMTP_PASS)
-        server.sendmail(SMTP_USER, to_email, msg.as_string())
\ No newline at end of file
+
+def _reset_email_for(email):
+    from utils.database_connection import create_reset_token, get_db_connection
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT username FROM users WHERE email = %s", (email,))
+            user = cur.fetchone()
+    if not user:
+        return None
+    return build_reset_email(email, create_reset_token(user[0]))
+
+
+def send_reset_email(to_email):
+    """Queue a password reset for ``to_email``, whether or not it has an account.
+
+    The mail worker looks the account up, creates the token and sends the
+    link, so the request does the same work either way and its timing doesn't
+    say whether the address is registered.
+    """
+    return mailer.enqueue(functools.partial(_reset_email_for, to_email))
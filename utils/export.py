@@ -0,0 +1,133 @@
+"""Streaming export of a user's full meal, macro or weight history.
+
+Rows are read through a server-side (named) cursor ``BATCH_SIZE`` at a time
+and each batch is encoded and handed to the response before the next one is
+fetched, so a worker holds one batch in memory whatever the history size.
+CSV is written batch by batch; Parquet writes one row group per batch and
+needs the optional ``pyarrow`` package.
+"""
+import csv
+import importlib.util
+import io
+import os
+import secrets
+
+from utils.database_connection import get_db_connection
+
+BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+# name -> (table, [(column SQL, header, parquet type)]), oldest row first
+EXPORTS = {
+    "meals": ("calories_table", [
+        ("date", "Date", "timestamp"),
+        ("meal_name", "Meal", "string"),
+        ("calories::float8", "Calories", "float64"),
+    ]),
+    "macros": ("macros_table", [
+        ("date", "Date", "timestamp"),
+        ("meal_name", "Meal", "string"),
+        ("protein::float8", "Protein", "float64"),
+        ("carbs::float8", "Carbs", "float64"),
+        ("fats::float8", "Fat", "float64"),
+    ]),
+    "weight": ("bodyweight", [
+        ("created_at", "Date", "timestamp"),
+        ("weight_kg::float8", "Weight (kg)", "float64"),
+    ]),
+}
+ORDER_COLUMN = {"calories_table": "date", "macros_table": "date", "bodyweight": "created_at"}
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+def parquet_available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def export_links(name):
+    """Download links for one export, to put under the matching history table.
+
+    The Parquet link is left out when pyarrow is not installed.
+    """
+    from dash import html
+    links = ["⬇️ Download: ", html.A("CSV", href=f"/api/v1/export?data={name}&format=csv", className="me-2")]
+    if parquet_available():
+        links.append(html.A("Parquet", href=f"/api/v1/export?data={name}&format=parquet"))
+    return html.Div(links, className="text-end small mt-2")
+
+
+def iter_batches(name, username, batch_size=BATCH_SIZE):
+    """Yield lists of up to ``batch_size`` row tuples of one export for ``username``."""
+    table, columns = EXPORTS[name]
+    with get_db_connection() as conn:
+        # Named, so Postgres keeps the result and sends it one batch at a time
+        with conn.cursor(name=f"export_{secrets.token_hex(8)}") as cur:
+            cur.itersize = batch_size
+            cur.execute(
+                f"SELECT {', '.join(sql for sql, _, _ in columns)} FROM {table} "
+                f"WHERE username = %s ORDER BY {ORDER_COLUMN[table]}",
+                (username,),
+            )
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+
+def csv_stream(name, username):
+    """The export as CSV, one encoded chunk per batch, header first."""
+    _, columns = EXPORTS[name]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for _, header, _ in columns])
+    for rows in iter_batches(name, username):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _Chunks(io.RawIOBase):
+    """Write-only file that keeps what was written until it is drained."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def parquet_stream(name, username):
+    """The export as a Parquet file, one row group per batch."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    _, columns = EXPORTS[name]
+    # Microseconds, as Postgres stores them
+    types = {"timestamp": pa.timestamp("us"), "string": pa.string(), "float64": pa.float64()}
+    schema = pa.schema([(header, types[kind]) for _, header, kind in columns])
+    sink = _Chunks()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for rows in iter_batches(name, username):
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(zip(*rows), schema)],
+                schema=schema,
+            ))
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,98 @@
+"""Load a FoodData Central CSV release into the local food tables.
+
+    python -m utils.fdc_import path/to/FoodData_Central_csv_2024-10-31
+    python -m utils.fdc_import path/to/release --data-types foundation_food,branded_food
+
+Download a CSV release from https://fdc.nal.usda.gov/download-datasets and unzip
+it first; the importer reads ``food.csv``, ``nutrient.csv`` and
+``food_nutrient.csv``. Everything is loaded in one transaction, so re-running
+with a newer release updates the tables in place and a failed import leaves the
+previous data untouched.
+"""
+import argparse
+import csv
+import sys
+from pathlib import Path
+
+from utils.database_connection import get_db_connection
+
+# Branded foods are ~2M rows; opt in with --data-types
+DEFAULT_DATA_TYPES = ("foundation_food", "sr_legacy_food", "survey_fndds_food")
+
+
+def _copy_to_staging(cur, path, table):
+    """COPY a release CSV into a temp table whose text columns follow its header.
+
+    Column sets differ slightly between releases, so the staging table is built
+    from whatever the file contains and only the needed columns are read later.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        columns = next(csv.reader(f))
+    column_sql = ", ".join('"{}" TEXT'.format(column.replace('"', '')) for column in columns)
+    cur.execute(f"CREATE TEMP TABLE {table} ({column_sql}) ON COMMIT DROP")
+    with open(path, encoding="utf-8") as f:
+        cur.copy_expert(f"COPY {table} FROM STDIN WITH (FORMAT csv, HEADER true)", f)
+
+
+def import_release(release_dir, data_types=DEFAULT_DATA_TYPES):
+    """Import a release directory and return ``(foods, food_nutrients)`` upserted."""
+    release_dir = Path(release_dir)
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            _copy_to_staging(cur, release_dir / "nutrient.csv", "stage_nutrient")
+            _copy_to_staging(cur, release_dir / "food.csv", "stage_food")
+            _copy_to_staging(cur, release_dir / "food_nutrient.csv", "stage_food_nutrient")
+
+            cur.execute(
+                """
+                INSERT INTO fdc_nutrient (id, name, unit_name)
+                SELECT id::integer, name, unit_name FROM stage_nutrient
+                ON CONFLICT (id) DO UPDATE SET name = EXCLUDED.name, unit_name = EXCLUDED.unit_name
+                """
+            )
+            cur.execute(
+                """
+                INSERT INTO fdc_food (fdc_id, data_type, description)
+                SELECT fdc_id::integer, data_type, description FROM stage_food
+                WHERE data_type = ANY(%s) AND description <> ''
+                ON CONFLICT (fdc_id) DO UPDATE
+                    SET data_type = EXCLUDED.data_type, description = EXCLUDED.description
+                """,
+                (list(data_types),)
+            )
+            foods = cur.rowcount
+            cur.execute(
+                """
+                INSERT INTO fdc_food_nutrient (fdc_id, nutrient_id, amount)
+                SELECT DISTINCT ON (s.fdc_id::integer, s.nutrient_id::integer)
+                    s.fdc_id::integer, s.nutrient_id::integer, s.amount::numeric
+                FROM stage_food_nutrient s
+                JOIN fdc_food f ON f.fdc_id = s.fdc_id::integer
+                JOIN fdc_nutrient n ON n.id = s.nutrient_id::integer
+                WHERE s.amount <> ''
+                ON CONFLICT (fdc_id, nutrient_id) DO UPDATE SET amount = EXCLUDED.amount
+                """
+            )
+            food_nutrients = cur.rowcount
+            cur.execute("ANALYZE fdc_food")
+            cur.execute("ANALYZE fdc_food_nutrient")
+    return foods, food_nutrients
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import a FoodData Central CSV release")
+    parser.add_argument("release_dir", help="directory containing food.csv, nutrient.csv and food_nutrient.csv")
+    parser.add_argument(
+        "--data-types",
+        default=",".join(DEFAULT_DATA_TYPES),
+        help="comma-separated FDC data types to load (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+
+    foods, food_nutrients = import_release(args.release_dir, args.data_types.split(","))
+    print(f"✅ Imported {foods} foods and {food_nutrients} nutrient values")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import psycopg2
+
+from utils.database_connection import get_db_connection
+from utils.usda_query import normalise_query, query_usda_info, PAGE_SIZE
+
+# Energy (kcal, then the two Atwater variants some foundation foods use instead),
+# protein, fat, carbohydrate; in the order the cards should see them
+SEARCH_NUTRIENT_IDS = [1008, 2048, 2047, 1003, 1004, 1005]
+ENERGY_NUTRIENT_IDS = {1008, 2048, 2047}
+
+
+def search_local_foods(query, limit=PAGE_SIZE):
+    """Search the imported FoodData Central tables.
+
+    Matches on the full-text index first and falls back to trigram word
+    similarity for partial words and typos. Results use the same shape as the
+    API's ``foods`` list so callers can treat both sources alike.
+    """
+    query = normalise_query(query)
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                WITH matches AS (
+                    SELECT fdc_id, description, data_type,
+                           ts_rank(description_tsv, plainto_tsquery('english', %(q)s)) AS rank,
+                           word_similarity(%(q)s, description) AS sim
+                    FROM fdc_food
+                    WHERE description_tsv @@ plainto_tsquery('english', %(q)s)
+                       OR %(q)s <%% description
+                    ORDER BY rank DESC, sim DESC, fdc_id
+                    LIMIT %(limit)s
+                )
+                SELECT m.fdc_id, m.description, m.data_type, n.id, n.name, n.unit_name, fn.amount
+                FROM matches m
+                LEFT JOIN fdc_food_nutrient fn
+                    ON fn.fdc_id = m.fdc_id AND fn.nutrient_id = ANY(%(nutrients)s)
+                LEFT JOIN fdc_nutrient n ON n.id = fn.nutrient_id
+                ORDER BY m.rank DESC, m.sim DESC, m.fdc_id, array_position(%(nutrients)s, fn.nutrient_id)
+                """,
+                {"q": query, "limit": limit, "nutrients": SEARCH_NUTRIENT_IDS}
+            )
+            rows = cur.fetchall()
+
+    foods = {}
+    for fdc_id, description, data_type, nutrient_id, name, unit, amount in rows:
+        food = foods.setdefault(fdc_id, {
+            "fdcId": fdc_id,
+            "description": description,
+            "dataType": data_type,
+            "foodNutrients": [],
+        })
+        if nutrient_id is None:
+            continue
+        if nutrient_id in ENERGY_NUTRIENT_IDS:
+            # Only the first (preferred) energy value is kept, labelled like the API does
+            if any(n["nutrientName"] == "Energy" for n in food["foodNutrients"]):
+                continue
+            name = "Energy"
+        food["foodNutrients"].append({
+            "nutrientId": nutrient_id,
+            "nutrientName": name,
+            "unitName": unit,
+            "value": float(amount),
+        })
+    return list(foods.values())
+
+
+def search_foods(query):
+    """Answer from the local database, calling the USDA API only on a miss.
+
+    A missing or unavailable local database counts as a miss.
+    """
+    try:
+        foods = search_local_foods(query)
+    except psycopg2.Error:
+        foods = []
+    return foods or query_usda_info(query)
@@ -0,0 +1,245 @@
+"""Request, callback, database and USDA timings for ``/metrics``.
+
+``init_app(app)`` hooks the Dash app's Flask server:
+
+* every ``/_dash-update-component`` request is timed and sized, labelled with
+  the name of the Python function behind the callback;
+* ``/metrics`` serves everything below in the Prometheus text format, plus
+  connection pool and history cache gauges;
+* ``/healthz`` runs ``SELECT 1`` and answers 200 or 503, for readiness probes.
+
+Metrics are kept per process. Under gunicorn each worker reports its own
+numbers, labelled with its pid, and Prometheus sums them. Background jobs run
+in short-lived processes nobody scrapes, so a job wraps its work in
+``job_metrics()``, which adds what it recorded to totals in the shared job
+cache; every worker reports those under ``worker="jobs"``. Set METRICS_TOKEN
+to require ``Authorization: Bearer <token>`` on ``/metrics``.
+"""
+import bisect
+import copy
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+JOB_METRICS_KEY = "metrics:jobs"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1_000, 5_000, 20_000, 100_000, 500_000, 2_000_000, 10_000_000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        """A copy of every series, for ``added_since``."""
+        with self._lock:
+            return copy.deepcopy(self._series)
+
+    def added_since(self, snapshot):
+        """What was observed after ``snapshot`` was taken, in the same shape."""
+        added = {}
+        with self._lock:
+            for label_values, (counts, total, count) in self._series.items():
+                before = snapshot.get(label_values, [[0] * len(self.buckets), 0.0, 0])
+                if count > before[2]:
+                    added[label_values] = [
+                        [now - then for now, then in zip(counts, before[0])], total - before[1], count - before[2],
+                    ]
+        return added
+
+    def render(self, common, extra=()):
+        """This process's series labelled with ``common``, then any ``(labels, series)`` in ``extra``."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            lines += self._series_lines(common, self._series)
+        for labels, series in extra:
+            lines += self._series_lines(labels, series)
+        return lines
+
+    def _series_lines(self, common, series):
+        lines = []
+        for label_values, (counts, total, count) in sorted(series.items()):
+            labels = common + list(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels(labels + [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(labels + [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(labels)} {count}")
+        return lines
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _gauges(name, help, values, common):
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    for key, value in sorted(values.items()):
+        lines.append(f"{name}{_labels(common + [('stat', key)])} {value}")
+    return lines
+
+
+callback_seconds = Histogram(
+    "dash_callback_duration_seconds", "Time to answer a Dash callback request.", ("callback",))
+callback_bytes = Histogram(
+    "dash_callback_response_bytes", "Uncompressed size of a callback response.", ("callback",), SIZE_BUCKETS)
+callback_queries = Histogram(
+    "dash_callback_db_queries", "Database statements executed per callback.", ("callback",), COUNT_BUCKETS)
+db_seconds = Histogram(
+    "db_query_duration_seconds", "Time to execute one database statement.", ("statement",))
+usda_seconds = Histogram(
+    "usda_request_duration_seconds", "Time for one FoodData Central API call.", ("outcome",))
+usda_cache = Histogram(
+    "usda_cache_lookup_duration_seconds", "Time for one on-disk USDA cache lookup.", ("result",))
+
+HISTOGRAMS = (callback_seconds, callback_bytes, callback_queries, db_seconds, usda_seconds, usda_cache)
+
+# Statement count for the callback being served on this thread
+_request = threading.local()
+
+
+def observe_query(sql, seconds):
+    """Record one database statement; called by the pool's cursors."""
+    if isinstance(sql, bytes):
+        sql = sql[:64].decode("utf-8", "replace")
+    words = sql.split(None, 1) if isinstance(sql, str) else None
+    statement = words[0].upper() if words else "UNKNOWN"
+    db_seconds.observe(seconds, statement)
+    if getattr(_request, "queries", None) is not None:
+        _request.queries += 1
+
+
+@contextmanager
+def job_metrics():
+    """Add everything observed inside the block to the shared background job totals.
+
+    For background callbacks: their process is forked from a worker (so starts
+    with that worker's numbers, which are left out) and gone before anyone
+    scrapes it.
+    """
+    before = {histogram.name: histogram.snapshot() for histogram in HISTOGRAMS}
+    try:
+        yield
+    finally:
+        added = {histogram.name: histogram.added_since(before[histogram.name]) for histogram in HISTOGRAMS}
+        from utils.background import cache
+        try:
+            with cache.transact():
+                totals = cache.get(JOB_METRICS_KEY, default={})
+                for name, series in added.items():
+                    _merge(totals.setdefault(name, {}), series)
+                cache.set(JOB_METRICS_KEY, totals)
+        except Exception:
+            logger.exception("Could not save background job metrics")
+
+
+def _merge(totals, series):
+    for label_values, (counts, total, count) in series.items():
+        current = totals.setdefault(label_values, [[0] * len(counts), 0.0, 0])
+        current[0] = [a + b for a, b in zip(current[0], counts)]
+        current[1] += total
+        current[2] += count
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    from utils.background import cache
+    from utils.cache import history_cache
+    from utils.database_connection import pool_stats
+
+    common = [("worker", os.getpid())]
+    jobs = cache.get(JOB_METRICS_KEY, default={})
+    lines = []
+    for histogram in HISTOGRAMS:
+        extra = [([("worker", "jobs")], jobs[histogram.name])] if histogram.name in jobs else []
+        lines += histogram.render(common, extra)
+    lines += _gauges("db_pool", "Connection pool counters for this worker.", pool_stats(), common)
+    lines += _gauges("history_cache", "History cache counters for this worker.", history_cache.stats(), common)
+    return "\n".join(lines) + "\n"
+
+
+def _callback_name(app, payload):
+    output = (payload or {}).get("output")
+    entry = app.callback_map.get(output) if output else None
+    func = entry.get("callback") if entry else None
+    return getattr(func, "__name__", None) or output or "unknown"
+
+
+def init_app(app):
+    """Instrument a Dash app's server and add the ``/metrics`` and ``/healthz`` routes."""
+    from flask import Response, g, request
+
+    server = app.server
+
+    @server.before_request
+    def _start_timer():
+        if request.path.endswith("/_dash-update-component"):
+            g.metrics_start = time.perf_counter()
+            _request.queries = 0
+
+    @server.after_request
+    def _record_callback(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            name = _callback_name(app, request.get_json(silent=True))
+            callback_seconds.observe(time.perf_counter() - start, name)
+            # Runs before Flask-Compress, so this is the size before compression
+            if not response.direct_passthrough:
+                callback_bytes.observe(len(response.get_data()), name)
+            callback_queries.observe(_request.queries, name)
+            _request.queries = None
+        return response
+
+    @server.route("/metrics")
+    def metrics():
+        if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+            return Response("unauthorized\n", status=401, mimetype="text/plain")
+        return Response(render(), mimetype="text/plain; version=0.0.4")
+
+    @server.route("/healthz")
+    def healthz():
+        from utils.database_connection import get_db_connection
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                    cur.fetchone()
+        except Exception:
+            # The error can name hosts and users; it goes to the log, not the probe
+            logger.exception("Health check failed")
+            return Response("database unavailable\n", status=503, mimetype="text/plain")
+        return Response("ok\n", mimetype="text/plain")
@@ -0,0 +1,178 @@
+"""Versioned Postgres schema migrations.
+
+Run at deploy time, before the web workers start:
+
+    python -m utils.migrations            # apply pending migrations
+    python -m utils.migrations --explain  # check the hot queries use an index
+
+Migrations are the numbered ``data/migrations/*.sql`` files. Each one is applied
+once, in order, and recorded in ``schema_migrations``; re-running the command is
+a no-op when the database is up to date.
+"""
+import argparse
+import sys
+from datetime import date, datetime
+from pathlib import Path
+
+from utils.database_connection import get_db_connection
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "data" / "migrations"
+
+# Arbitrary key for pg_advisory_xact_lock so concurrent deploys apply migrations one at a time
+MIGRATION_LOCK_ID = 4_812_227
+
+# Queries on the request path and the parameters used to plan them
+HOT_QUERIES = {
+    # First page and a keyset page of each history table, as built by utils.pagination.fetch_page
+    "meals page": (
+        "SELECT id, date, date, meal_name, calories FROM calories_table WHERE username = %s "
+        "ORDER BY date DESC, id DESC LIMIT %s OFFSET %s",
+        ("explain-user", 20, 0),
+    ),
+    "meals keyset page": (
+        "SELECT id, date, date, meal_name, calories FROM calories_table WHERE username = %s "
+        "AND (date, id) < (%s, %s) ORDER BY date DESC, id DESC LIMIT %s OFFSET %s",
+        ("explain-user", datetime(2024, 1, 1), 1000, 20, 0),
+    ),
+    "meals count": (
+        "SELECT COUNT(*) FROM calories_table WHERE username = %s",
+        ("explain-user",),
+    ),
+    "macros page": (
+        "SELECT id, date, date, meal_name, protein, carbs, fats FROM macros_table WHERE username = %s "
+        "ORDER BY date DESC, id DESC LIMIT %s OFFSET %s",
+        ("explain-user", 20, 0),
+    ),
+    "macros keyset page": (
+        "SELECT id, date, date, meal_name, protein, carbs, fats FROM macros_table WHERE username = %s "
+        "AND (date, id) < (%s, %s) ORDER BY date DESC, id DESC LIMIT %s OFFSET %s",
+        ("explain-user", datetime(2024, 1, 1), 1000, 20, 0),
+    ),
+    "weight page": (
+        "SELECT id, created_at, created_at, round((weight_kg * 1)::numeric, 2) FROM bodyweight "
+        "WHERE username = %s ORDER BY created_at DESC, id DESC LIMIT %s OFFSET %s",
+        ("explain-user", 20, 0),
+    ),
+    "weight keyset page": (
+        "SELECT id, created_at, created_at, round((weight_kg * 1)::numeric, 2) FROM bodyweight "
+        "WHERE username = %s AND (created_at, id) < (%s, %s) ORDER BY created_at DESC, id DESC LIMIT %s OFFSET %s",
+        ("explain-user", datetime(2024, 1, 1), 1000, 20, 0),
+    ),
+    # Chart reads: the weight history, its zoom window and the nutrition rollup
+    "weight history": (
+        "SELECT created_at, weight_kg FROM bodyweight WHERE username = %s ORDER BY created_at",
+        ("explain-user",),
+    ),
+    "weight window": (
+        "SELECT created_at, weight_kg FROM bodyweight WHERE username = %s "
+        "AND created_at >= %s AND created_at < %s ORDER BY created_at",
+        ("explain-user", date(2024, 1, 1), date(2024, 2, 1)),
+    ),
+    "calorie totals": (
+        "SELECT date_trunc(%s, day)::date AS period, SUM(kcal) FROM daily_nutrition_summary "
+        "WHERE username = %s AND calorie_entries > 0 GROUP BY period ORDER BY period",
+        ("day", "explain-user"),
+    ),
+    "reset token": (
+        "SELECT user_id FROM password_resets WHERE token = %s AND expires_at > %s",
+        ("explain-token", datetime(2024, 1, 1)),
+    ),
+    "user by email": (
+        "SELECT username FROM users WHERE email = %s",
+        ("explain@example.com",),
+    ),
+    "user by username": (
+        "SELECT username, password FROM users WHERE username = %s",
+        ("explain-user",),
+    ),
+}
+
+
+def load_migrations():
+    """Return ``(version, path)`` for every migration file, in version order."""
+    migrations = []
+    for path in MIGRATIONS_DIR.glob("*.sql"):
+        version = int(path.name.split("_", 1)[0])
+        migrations.append((version, path))
+    return sorted(migrations)
+
+
+def apply_migrations():
+    """Apply pending migrations in one transaction and return their file names."""
+    applied_now = []
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP NOT NULL DEFAULT now()
+                )
+                """
+            )
+            cur.execute("SELECT version FROM schema_migrations")
+            applied = {row[0] for row in cur.fetchall()}
+
+            for version, path in load_migrations():
+                if version in applied:
+                    continue
+                cur.execute(path.read_text())
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (version, path.name),
+                )
+                applied_now.append(path.name)
+    return applied_now
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def explain_hot_queries():
+    """EXPLAIN each hot query and return ``{name: (uses_index, node_types)}``.
+
+    Sequential scans are disabled for the check so that a nearly empty dev
+    database still reports whether a usable index exists.
+    """
+    results = {}
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL enable_seqscan = off")
+            for name, (query, params) in HOT_QUERIES.items():
+                cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+                plan = cur.fetchone()[0][0]["Plan"]
+                node_types = [node["Node Type"] for node in _plan_nodes(plan)]
+                uses_index = any("Index" in node_type for node_type in node_types)
+                results[name] = (uses_index and "Seq Scan" not in node_types, node_types)
+        conn.rollback()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply FitSync schema migrations")
+    parser.add_argument("--explain", action="store_true", help="check that hot queries use an index scan")
+    args = parser.parse_args(argv)
+
+    if args.explain:
+        failures = 0
+        for name, (ok, node_types) in explain_hot_queries().items():
+            print(f"{'✅' if ok else '❌'} {name}: {' > '.join(node_types)}")
+            failures += not ok
+        return 1 if failures else 0
+
+    applied = apply_migrations()
+    if applied:
+        for name in applied:
+            print(f"✅ Applied {name}")
+    else:
+        print("✅ Schema is up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
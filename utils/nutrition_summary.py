@@ -0,0 +1,89 @@
+"""The ``daily_nutrition_summary`` rollup: one row of totals per user and day.
+
+``record_meal`` adds a meal to its day inside the caller's transaction, so the
+rollup can never disagree with the raw tables. Rebuild it from the raw tables
+(after a manual data fix, say) with:
+
+    python -m utils.nutrition_summary             # every user
+    python -m utils.nutrition_summary --user NAME # one user
+"""
+import argparse
+import sys
+
+from utils import data_version
+from utils.cache import history_cache
+from utils.database_connection import get_db_connection
+
+REBUILD_SQL = """
+    INSERT INTO daily_nutrition_summary (username, day, kcal, protein, carbs, fat, calorie_entries, macro_entries)
+    SELECT username, day, SUM(kcal), SUM(protein), SUM(carbs), SUM(fat), SUM(calorie_entries), SUM(macro_entries)
+    FROM (
+        SELECT username, date::date AS day, calories AS kcal, 0 AS protein, 0 AS carbs, 0 AS fat,
+               1 AS calorie_entries, 0 AS macro_entries
+        FROM calories_table {where}
+        UNION ALL
+        SELECT username, date::date, 0, protein, carbs, fats, 0, 1
+        FROM macros_table {where}
+    ) entries
+    GROUP BY username, day
+"""
+
+
+def record_meal(cur, username, logged_at, kcal=None, protein=None, carbs=None, fat=None):
+    """Add one logged meal to its day's totals, on the caller's cursor.
+
+    Pass ``kcal`` for a calorie-tracker entry and the three macros for a macro
+    entry; the matching entry counter goes up by one.
+    """
+    is_macro = protein is not None
+    cur.execute(
+        """
+        INSERT INTO daily_nutrition_summary
+            (username, day, kcal, protein, carbs, fat, calorie_entries, macro_entries)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (username, day) DO UPDATE SET
+            kcal = daily_nutrition_summary.kcal + EXCLUDED.kcal,
+            protein = daily_nutrition_summary.protein + EXCLUDED.protein,
+            carbs = daily_nutrition_summary.carbs + EXCLUDED.carbs,
+            fat = daily_nutrition_summary.fat + EXCLUDED.fat,
+            calorie_entries = daily_nutrition_summary.calorie_entries + EXCLUDED.calorie_entries,
+            macro_entries = daily_nutrition_summary.macro_entries + EXCLUDED.macro_entries
+        """,
+        (
+            username, logged_at.date(), kcal or 0, protein or 0, carbs or 0, fat or 0,
+            int(kcal is not None), int(is_macro),
+        )
+    )
+
+
+def rebuild(username=None):
+    """Recompute the rollup from the raw tables; returns the number of days written."""
+    where, params = ("WHERE username = %s", [username]) if username else ("", [])
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM daily_nutrition_summary" + (" WHERE username = %s" if username else ""),
+                params,
+            )
+            cur.execute(REBUILD_SQL.format(where=where), params * 2)
+            days = cur.rowcount
+            version = data_version.bump(cur, username)
+    if username:
+        history_cache.written(username, version)
+    else:
+        history_cache.clear()
+    return days
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the daily nutrition summary from logged meals")
+    parser.add_argument("--user", help="only rebuild this username")
+    args = parser.parse_args(argv)
+
+    days = rebuild(args.user)
+    print(f"✅ Rebuilt {days} daily summaries")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""Server-side paging, sorting and filtering for the history DataTables.
+
+Tables use ``page_action="custom"``/``sort_action="custom"``/``filter_action="custom"``
+and call :func:`fetch_page` with the table's paging props. Pages are read with
+keyset pagination: the sort value and id of the last row on each page are kept
+in a ``dcc.Store`` and the next page starts strictly after them, so reading page
+N costs the same as page 0 regardless of history length. Jumping to a page whose
+start is unknown (e.g. "last page") falls back to OFFSET.
+"""
+import json
+import math
+import re
+
+import dash
+from dash import Patch
+
+from utils.cache import history_cache, sync_history_cache
+from utils.database_connection import get_db_connection
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# filter_query operators (optionally prefixed with s/i for case sensitivity) -> SQL
+FILTER_OPERATORS = {
+    "datestartswith": "startswith", "contains": "contains",
+    "eq": "=", "=": "=", "ne": "<>", "!=": "<>",
+    "gt": ">", ">": ">", "ge": ">=", ">=": ">=",
+    "lt": "<", "<": "<", "le": "<=", "<=": "<=",
+}
+FILTER_PART = re.compile(
+    r"^\s*\{(?P<name>[^}]+)\}\s+[si]?(?P<op>datestartswith|contains|[a-z]{2}|[<>!]=|[<>=])\s+(?P<value>.+?)\s*$"
+)
+
+
+def table_spec(table, columns, default_sort="Date", date_format=DATE_FORMAT):
+    """Describe a user-owned table.
+
+    ``columns`` maps the DataTable column id to ``(sql_expression, kind)`` where
+    kind is ``"timestamp"``, ``"number"`` or ``"text"``. Expressions are trusted
+    SQL and must never contain user input.
+    """
+    return {"table": table, "columns": columns, "default_sort": default_sort, "date_format": date_format}
+
+
+def _split_filter_part(part):
+    match = FILTER_PART.match(part)
+    if not match or match["op"] not in FILTER_OPERATORS:
+        return None, None, None
+    value = match["value"]
+    if len(value) > 1 and value[0] == value[-1] and value[0] in ("'", '"', "`"):
+        value = value[1:-1].replace("\\" + value[0], value[0])
+    return match["name"], FILTER_OPERATORS[match["op"]], value
+
+
+def _filter_clauses(spec, filter_query):
+    clauses, params = [], []
+    for part in (filter_query or "").split(" && "):
+        name, operator, value = _split_filter_part(part)
+        if name not in spec["columns"]:
+            continue
+        expr, kind = spec["columns"][name]
+        if operator in ("contains", "startswith"):
+            pattern = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            pattern = f"%{pattern}%" if operator == "contains" else f"{pattern}%"
+            clauses.append(f"CAST({expr} AS TEXT) ILIKE %s")
+            params.append(pattern)
+        elif kind == "number":
+            try:
+                params.append(float(value))
+            except ValueError:
+                continue
+            clauses.append(f"{expr} {operator} %s")
+        else:
+            clauses.append(f"{expr} {operator} %s")
+            params.append(value)
+    return clauses, params
+
+
+def _sort(spec, sort_by):
+    if sort_by and sort_by[0]["column_id"] in spec["columns"]:
+        return sort_by[0]["column_id"], sort_by[0]["direction"] == "desc"
+    return spec["default_sort"], True
+
+
+def _format(value, kind, date_format):
+    if kind == "timestamp":
+        return value.strftime(date_format)
+    if kind == "number":
+        return float(value)
+    return value
+
+
+def _cursor_value(value, kind):
+    if kind == "timestamp":
+        return value.isoformat()
+    if kind == "number":
+        return float(value)
+    return value
+
+
+def shows_newest_first(spec, page_current, sort_by, filter_query):
+    """True when the table is on its unfiltered first page, newest rows on top.
+
+    A row that was just written belongs at the top of exactly that view, so it
+    can be prepended with a ``Patch`` instead of re-reading the page.
+    """
+    sort_column, descending = _sort(spec, sort_by)
+    return not page_current and not filter_query and sort_column == spec["default_sort"] and descending
+
+
+def new_row_outputs(spec, row, version, page_current, page_size, sort_by, filter_query):
+    """The table's ``(data, version, cursors)`` outputs after ``row`` was written.
+
+    When the row belongs at the top of the visible page (``shows_newest_first``)
+    it is prepended with a ``Patch`` and the stored keyset cursors are reset,
+    since every later page now starts one row earlier. Otherwise the data
+    ``version`` is bumped so the table re-reads its current page.
+    """
+    if shows_newest_first(spec, page_current, sort_by, filter_query):
+        table = Patch()
+        table.prepend(row)
+        del table[page_size]
+        return table, dash.no_update, {}
+    return dash.no_update, (version or 0) + 1, dash.no_update
+
+
+def fetch_page(spec, username, page_current, page_size, sort_by, filter_query, cursors, version=None):
+    """Read one page of ``username``'s rows.
+
+    Returns ``(rows, page_count, cursors)``; pass ``cursors`` back in on the next
+    call. Cursors are discarded whenever the columns, sort, filter or page size
+    change, and whenever the table's data ``version`` is bumped after a write,
+    since a new row shifts every page boundary after it.
+    """
+    page_current = page_current or 0
+    signature = json.dumps([spec["columns"], sort_by, filter_query, page_size, version], sort_keys=True)
+    if not cursors or cursors.get("key") != signature:
+        cursors = {"key": signature, "pages": {}}
+
+    sort_column, descending = _sort(spec, sort_by)
+    sort_expr, sort_kind = spec["columns"][sort_column]
+    direction = "DESC" if descending else "ASC"
+
+    clauses, params = _filter_clauses(spec, filter_query)
+    where = " AND ".join(["username = %s"] + clauses)
+    where_params = [username] + params
+
+    page_where, page_params, offset = where, list(where_params), 0
+    start = cursors["pages"].get(str(page_current))
+    if page_current and start:
+        page_where += f" AND ({sort_expr}, id) {'<' if descending else '>'} (%s, %s)"
+        page_params += start
+    elif page_current:
+        offset = page_current * page_size
+
+    select = ", ".join(expr for expr, _ in spec["columns"].values())
+    page_sql = (
+        f"SELECT id, {sort_expr}, {select} FROM {spec['table']} WHERE {page_where} "
+        f"ORDER BY {sort_expr} {direction}, id {direction} LIMIT %s OFFSET %s"
+    )
+    count_sql = f"SELECT COUNT(*) FROM {spec['table']} WHERE {where}"
+    page_params += [page_size, offset]
+
+    def load():
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(page_sql, page_params)
+                records = cur.fetchall()
+                cur.execute(count_sql, where_params)
+                return records, cur.fetchone()[0]
+
+    sync_history_cache(username)
+    records, total = history_cache.get_or_load(
+        username, spec["table"], (page_sql, tuple(page_params), tuple(where_params)), load
+    )
+
+    kinds = [kind for _, kind in spec["columns"].values()]
+    rows = [
+        {
+            name: _format(value, kind, spec["date_format"])
+            for name, kind, value in zip(spec["columns"], kinds, record[2:])
+        }
+        for record in records
+    ]
+    if len(records) == page_size:
+        last = records[-1]
+        cursors["pages"][str(page_current + 1)] = [_cursor_value(last[1], sort_kind), last[0]]
+
+    return rows, max(1, math.ceil(total / page_size)), cursors
@@ -1,18 +1,191 @@
 from dotenv import load_dotenv
-from datetime import datetime, timedelta
-import psycopg2
-from psycopg2 import IntegrityError
-import secrets
+import json
 import os
-import bcrypt
-import requests
+import sqlite3
+import threading
+import time
+
+from utils import metrics
 
 load_dotenv()
 
 api_key = os.getenv('USDA_API_KEY')
 BASE_URL = "https://api.nal.usda.gov/fdc/v1/foods/search"
+PAGE_SIZE = 5
+
+# (connect, read) timeouts so a stalled upstream can't hold a worker indefinitely
+REQUEST_TIMEOUT = (
+    float(os.getenv("USDA_CONNECT_TIMEOUT", "3.05")),
+    float(os.getenv("USDA_READ_TIMEOUT", "10")),
+)
+
+CACHE_PATH = os.getenv(
+    "USDA_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "usda_cache.sqlite3"),
+)
+CACHE_TTL = float(os.getenv("USDA_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("USDA_CACHE_MAX_ENTRIES", "5000"))
+
+
+def normalise_query(query):
+    """Case- and whitespace-insensitive cache key for a search."""
+    return " ".join(query.lower().split())
+
+
+class QueryCache:
+    """On-disk search cache so results survive restarts and are shared by workers.
+
+    Entries expire after ``ttl`` seconds and the least recently used ones are
+    dropped once there are more than ``max_entries``. Cache failures are treated
+    as misses so a read-only disk never breaks search.
+    """
+
+    def __init__(self, path, ttl, max_entries):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS usda_cache (
+                    query TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS usda_cache_last_access_idx ON usda_cache (last_access)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        try:
+            conn = self._connect()
+            now = time.time()
+            row = conn.execute(
+                "SELECT payload FROM usda_cache WHERE query = ? AND fetched_at > ?",
+                (key, now - self.ttl),
+            ).fetchone()
+            if row is None:
+                return None
+            with conn:
+                conn.execute("UPDATE usda_cache SET last_access = ? WHERE query = ?", (now, key))
+            return json.loads(row[0])
+        except sqlite3.Error:
+            return None
+
+    def set(self, key, value):
+        try:
+            conn = self._connect()
+            now = time.time()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO usda_cache (query, payload, fetched_at, last_access) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now, now),
+                )
+                conn.execute("DELETE FROM usda_cache WHERE fetched_at <= ?", (now - self.ttl,))
+                conn.execute(
+                    """
+                    DELETE FROM usda_cache WHERE query IN (
+                        SELECT query FROM usda_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                    )
+                    """,
+                    (self.max_entries,),
+                )
+        except sqlite3.Error:
+            pass
+
+
+cache = QueryCache(CACHE_PATH, CACHE_TTL, CACHE_MAX_ENTRIES)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Keep-alive HTTP session for this process, so repeat searches reuse the TLS connection."""
+    global _session, _session_pid
+    # requests is imported here so start-up only pays for it once somebody searches
+    import requests
+    from requests.adapters import HTTPAdapter
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=int(os.getenv("USDA_POOL_SIZE", "10")))
+            _session.mount("https://", adapter)
+            _session_pid = os.getpid()
+        return _session
+
+
+class _InflightSearch:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def fetch_usda_foods(query):
+    """Uncached API search; prefer :func:`query_usda_info`."""
+    params = {"query": query, "api_key": api_key, "pageSize": PAGE_SIZE}
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        resp = get_session().get(BASE_URL, params=params, timeout=REQUEST_TIMEOUT)
+        resp.raise_for_status()
+        foods = resp.json().get("foods", [])
+        outcome = "ok"
+        return foods
+    finally:
+        metrics.usda_seconds.observe(time.perf_counter() - start, outcome)
+
 
 def query_usda_info(query):
-    params = {"query": query, "api_key": api_key, "pageSize": 5}
-    resp = requests.get(BASE_URL, params=params)
-    return resp
\ No newline at end of file
+    """Search FoodData Central and return the list of matching foods.
+
+    Results come from the on-disk cache when possible. Concurrent searches for the
+    same normalised query share a single upstream request. Raises
+    ``requests.RequestException`` when the API call fails.
+    """
+    key = normalise_query(query)
+    start = time.perf_counter()
+    foods = cache.get(key)
+    metrics.usda_cache.observe(time.perf_counter() - start, "miss" if foods is None else "hit")
+    if foods is not None:
+        return foods
+
+    with _inflight_lock:
+        search = _inflight.get(key)
+        leader = search is None
+        if leader:
+            search = _inflight[key] = _InflightSearch()
+
+    if not leader:
+        search.done.wait()
+        if search.error is not None:
+            raise search.error
+        return search.result
+
+    try:
+        search.result = fetch_usda_foods(key)
+        cache.set(key, search.result)
+        return search.result
+    except Exception as e:
+        search.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+        search.done.set()
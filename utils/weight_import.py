@@ -0,0 +1,85 @@
+import base64
+import io
+from itertools import repeat
+
+from utils import data_version
+from utils.cache import history_cache
+from utils.database_connection import get_db_connection
+
+LBS_PER_KG = 2.20462
+
+UNIT_ALIASES = {
+    "kg": "kg", "kgs": "kg", "kilogram": "kg", "kilograms": "kg",
+    "lb": "lbs", "lbs": "lbs", "pound": "lbs", "pounds": "lbs",
+}
+
+
+def read_upload(contents, filename):
+    """Decode a dcc.Upload payload into a DataFrame (CSV or Excel)."""
+    # pandas takes longer to import than the rest of the app; load it on the first upload
+    import pandas as pd
+    content_type, content_string = contents.split(",")
+    decoded = base64.b64decode(content_string)
+    if filename.endswith(".csv"):
+        return pd.read_csv(io.StringIO(decoded.decode("utf-8")))
+    return pd.read_excel(io.BytesIO(decoded))
+
+
+def normalise_weights(df):
+    """Validate an uploaded sheet in one vectorised pass.
+
+    Expects ``Date`` and ``Weight`` columns (any case) and an optional ``Unit``
+    column; rows without a unit are taken as kg. Returns a frame of
+    ``created_at``/``weight_kg`` for the valid rows and the number rejected.
+    """
+    import pandas as pd
+    columns = {str(c).strip().lower(): c for c in df.columns}
+    missing = {"date", "weight"} - columns.keys()
+    if missing:
+        raise ValueError(f"missing column(s): {', '.join(sorted(missing))}")
+
+    # "mixed" parses each value on its own; otherwise pandas infers one format
+    # from the first row and every row written another way becomes NaT
+    dates = pd.to_datetime(df[columns["date"]], errors="coerce", format="mixed")
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_convert(None)
+    weights = pd.to_numeric(df[columns["weight"]], errors="coerce")
+    if "unit" in columns:
+        units = df[columns["unit"]].fillna("kg").astype(str).str.strip().str.lower().map(UNIT_ALIASES)
+    else:
+        units = pd.Series("kg", index=df.index)
+
+    valid = dates.notna() & weights.gt(0) & units.notna()
+    weight_kg = weights.where(units != "lbs", weights / LBS_PER_KG).round(2)
+
+    clean = pd.DataFrame({"created_at": dates[valid], "weight_kg": weight_kg[valid]})
+    return clean, int((~valid).sum())
+
+
+def import_weights(username, df, page_size=1000):
+    """Insert every valid row in a single transaction.
+
+    Returns ``(accepted, rejected)``. Nothing is written if the insert fails,
+    so a broken upload never leaves half its rows behind.
+    """
+    from psycopg2.extras import execute_values
+    clean, rejected = normalise_weights(df)
+    if clean.empty:
+        return 0, rejected
+
+    rows = zip(
+        repeat(username),
+        clean["weight_kg"].tolist(),
+        clean["created_at"].dt.to_pydatetime(),
+    )
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                "INSERT INTO bodyweight (username, weight_kg, created_at) VALUES %s",
+                list(rows),
+                page_size=page_size,
+            )
+            version = data_version.bump(cur, username)
+    history_cache.written(username, version, "bodyweight", "weight_trend")
+    return len(clean), rejected
@@ -0,0 +1,174 @@
+"""Smoothed trend, rolling averages and rate of change for the weight chart.
+
+Everything is worked out per day from the day's mean weigh-in, in kg:
+
+* ``trend`` is an exponentially smoothed weight. Each day moves it
+  ``TREND_ALPHA`` of the way towards that day's mean, and a gap of ``n`` days
+  counts as ``n`` steps, so a missed week does not make the next weigh-in jump
+  the line.
+* ``avg7`` and ``avg30`` average the daily means of the last 7 and 30
+  calendar days (missing days are skipped, not counted as zero).
+* ``rate`` is the change in ``trend`` over the last seven days, in kg/week,
+  and NaN until there is a week of history.
+
+A full history is computed with array operations only. Logging a weigh-in
+updates the user's cached ``WeightTrend`` with ``record_weight``, which only
+recomputes the last day.
+"""
+from utils.cache import cached
+from utils.database_connection import fetch_columns
+
+TREND_ALPHA = 0.1
+WINDOWS = (7, 30)
+
+
+class WeightTrend:
+    """Per-day weight statistics for one user, oldest day first."""
+
+    def __init__(self, days, sums, counts, trend, averages, rate):
+        self.days = days          # datetime64[D]
+        self.sums = sums
+        self.counts = counts
+        self.trend = trend
+        self.averages = averages  # window in days -> rolling average
+        self.rate = rate
+
+    @classmethod
+    def from_daily(cls, days, sums, counts):
+        """Compute everything from per-day weight sums and weigh-in counts."""
+        import numpy as np
+        days = np.asarray(days, dtype="datetime64[D]")
+        sums = np.asarray(sums, dtype=np.float64)
+        counts = np.asarray(counts, dtype=np.int64)
+        mean = sums / np.maximum(counts, 1)
+        trend = _smooth(days, mean)
+        averages = {window: _rolling_mean(days, mean, window) for window in WINDOWS}
+        return cls(days, sums, counts, trend, averages, _weekly_rate(days, trend))
+
+    def __len__(self):
+        return len(self.days)
+
+    def add(self, day, weight):
+        """A new ``WeightTrend`` with one more weigh-in of ``weight`` kg on ``day``.
+
+        A weigh-in on the last day or a new later day only recomputes that day;
+        one before the last day (an entry backdated by hand) recomputes the lot.
+        """
+        import numpy as np
+        day = np.datetime64(day, "D")
+        if len(self) and day < self.days[-1]:
+            index = int(np.searchsorted(self.days, day))
+            if self.days[index] == day:
+                sums, counts = self.sums.copy(), self.counts.copy()
+                sums[index] += weight
+                counts[index] += 1
+                return WeightTrend.from_daily(self.days, sums, counts)
+            return WeightTrend.from_daily(
+                np.insert(self.days, index, day), np.insert(self.sums, index, weight),
+                np.insert(self.counts, index, 1))
+
+        if len(self) and day == self.days[-1]:
+            days, sums, counts = self.days, self.sums.copy(), self.counts.copy()
+            sums[-1] += weight
+            counts[-1] += 1
+            # The day's trend is redone from the day before, not from its own old value
+            trend, averages, rate = self.trend[:-1], {w: a[:-1] for w, a in self.averages.items()}, self.rate[:-1]
+        else:
+            days, sums, counts = np.append(self.days, day), np.append(self.sums, weight), np.append(self.counts, 1)
+            trend, averages, rate = self.trend, self.averages, self.rate
+
+        mean = sums / counts
+        if len(trend):
+            step = 1 - (1 - TREND_ALPHA) ** float((days[-1] - days[-2]) / np.timedelta64(1, "D"))
+            last = trend[-1] + step * (mean[-1] - trend[-1])
+        else:
+            last = mean[-1]
+        trend = np.append(trend, last)
+
+        averages = {
+            window: np.append(values, mean[np.searchsorted(days, days[-1] - (window - 1)):].mean())
+            for window, values in averages.items()
+        }
+        rate = np.append(rate, _weekly_rate(days, trend, last_only=True))
+        return WeightTrend(days, sums, counts, trend, averages, rate)
+
+    def last_day_is_new(self):
+        """Whether the last day has exactly one weigh-in (so it was just appended)."""
+        return len(self) > 0 and int(self.counts[-1]) == 1
+
+    def columns(self, factor=1):
+        """Dates as "YYYY-MM-DD" and each statistic as a list, scaled by ``factor``."""
+        columns = {"Date": self.days.astype(str).tolist(), "Trend": _rounded(self.trend * factor)}
+        for window, values in self.averages.items():
+            columns[f"Avg{window}"] = _rounded(values * factor)
+        columns["Rate"] = _rounded(self.rate * factor)
+        return columns
+
+
+def _rounded(values):
+    import numpy as np
+    return [None if v != v else v for v in np.round(values, 2).tolist()]
+
+
+def _offsets(days):
+    return (days - days[0]).astype("timedelta64[D]").astype("float64")
+
+
+def _smooth(days, mean):
+    # trend[t] = sum over i <= t of mean[i] * a[i] * (1 - alpha) ** (t - t_i), where
+    # a[i] is the day's step towards its mean (1 for the first day). Summed with a
+    # running log-add-exp so long histories neither overflow nor underflow.
+    import numpy as np
+    if len(days) == 0:
+        return np.empty(0)
+    t = _offsets(days)
+    decay = np.log1p(-TREND_ALPHA)
+    steps = np.concatenate(([1.0], -np.expm1(decay * np.diff(t))))
+    # The weights sum to one, so shifting the means keeps the logs finite
+    base = mean.min() - 1
+    smoothed = np.exp(np.logaddexp.accumulate(np.log((mean - base) * steps) - decay * t) + decay * t)
+    return smoothed + base
+
+
+def _rolling_mean(days, mean, window):
+    import numpy as np
+    starts = np.searchsorted(days, days - (window - 1))
+    totals = np.concatenate(([0.0], np.cumsum(mean)))
+    ends = np.arange(1, len(days) + 1)
+    return (totals[ends] - totals[starts]) / (ends - starts)
+
+
+def _weekly_rate(days, trend, last_only=False):
+    # Trend now minus the trend seven days ago, read off the line between weigh-ins
+    import numpy as np
+    if len(days) == 0:
+        return np.empty(0)
+    t = _offsets(days)
+    at = t[-1:] if last_only else t
+    rate = trend[-len(at):] - np.interp(at - 7, t, trend)
+    rate[at - 7 < 0] = np.nan
+    return rate[0] if last_only else rate
+
+
+@cached("weight_trend")
+def load_trend(username):
+    """The user's ``WeightTrend``, from one row per weighed day."""
+    daily = fetch_columns(
+        """
+        SELECT created_at::date AS day, SUM(weight_kg) AS total, COUNT(*) AS entries FROM bodyweight
+        WHERE username = %s GROUP BY 1 ORDER BY 1
+        """,
+        (username,), [("day", "datetime64[ms]"), ("total", "float64"), ("entries", "int64")],
+    )
+    return WeightTrend.from_daily(daily["day"], daily["total"], daily["entries"])
+
+
+def record_weight(username, logged_at, weight_kg, generation):
+    """Fold a just-saved weigh-in into the user's cached trend, then return the trend.
+
+    ``generation`` is what ``history_cache.written`` returned for the save. The
+    cached trend is only updated when it was read just before the save;
+    otherwise it is loaded again.
+    """
+    load_trend.update(username, lambda trend: trend.add(logged_at.date(), weight_kg), generation=generation)
+    return load_trend(username)
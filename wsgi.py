@@ -0,0 +1,21 @@
+"""Production entry point for a WSGI server.
+
+    gunicorn wsgi:server
+
+Settings such as workers, threads and timeouts come from gunicorn.conf.py.
+``python app.py`` remains the local development server.
+"""
+from app import app, server
+
+__all__ = ["server"]
+
+# Never serve the dev tools (debug UI, hot reload, prop checks) in production,
+# whatever DASH_* variables happen to be set
+app.enable_dev_tools(
+    debug=False,
+    dev_tools_ui=False,
+    dev_tools_props_check=False,
+    dev_tools_serve_dev_bundles=False,
+    dev_tools_hot_reload=False,
+    dev_tools_silence_routes_logging=True,
+)